@@ -0,0 +1,441 @@
+"""
+Benchmarks of pylcaio on synthetic, realistically sized systems
+
+Generates an LCA database (background and foreground, as a matdict like
+scipy.io.loadmat() would return) and an EEIO table (as a pymrio-like object,
+with region/sector multiindex), feeds them to LCAIO through the usual
+extraction methods, and times and memory-profiles each step, up to exporting
+to Matlab files and reading the export back. Results can be stored as a
+baseline JSON file, against which later runs are compared to catch
+performance regressions.
+
+Sizes
+-----
+    - 'small':  a few seconds, for a quick check of a change
+    - 'medium': about a tenth of real databases
+    - 'full':   ecoinvent-sized background (~20k processes, ~2k stressors),
+                EXIOBASE-sized IO table (49 regions x 200 sectors); requires
+                a few GB of memory
+
+Usage
+-----
+    python benchmark_pylcaio.py --size small --save-baseline baseline.json
+    ... change pylcaio ...
+    python benchmark_pylcaio.py --size small --baseline baseline.json
+
+    The second call exits with a non-zero status if any step got slower, or
+    more memory-hungry, than the baseline by more than the tolerance.
+
+Dependencies
+------------
+    - numpy
+    - pandas
+    - scipy
+
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy.io
+import scipy.sparse
+
+import pylcaio
+
+
+SIZES = {
+    'small': {'n_background': 2000,
+              'n_stressors': 200,
+              'n_impacts': 20,
+              'n_foreground': 50,
+              'n_regions': 10,
+              'n_sectors': 40,
+              'n_hybridized': 20},
+    'medium': {'n_background': 5000,
+               'n_stressors': 500,
+               'n_impacts': 30,
+               'n_foreground': 200,
+               'n_regions': 20,
+               'n_sectors': 100,
+               'n_hybridized': 100},
+    'full': {'n_background': 20000,
+             'n_stressors': 2000,
+             'n_impacts': 50,
+             'n_foreground': 500,
+             'n_regions': 49,
+             'n_sectors': 200,
+             'n_hybridized': 500},
+}
+
+# Order in which steps run, each building on the previous ones
+STEPS = ('extract_background',
+         'extract_foreground',
+         'append_to_foreground',
+         'extract_io_background_from_pymrio',
+         'properties',
+         'hybridize_process',
+         'calc_lifecycle',
+         'to_matfile',
+         'read_matfile')
+
+HEADER = np.array([['FULL NAME', 'MATRIXID', 'UNIT']], dtype=object)
+
+
+# -----------------------SYNTHETIC SYSTEMS-------------------------------------
+#
+def random_sparse(n_rows, n_cols, per_column, scale, rng):
+    """ Random CSC matrix with about per_column non-zero entries per column,
+    each column summing to less than scale """
+    rows = rng.integers(n_rows, size=n_cols * per_column)
+    cols = np.repeat(np.arange(n_cols), per_column)
+    data = rng.random(n_cols * per_column) * scale / per_column
+    return scipy.sparse.csc_matrix((data, (rows, cols)),
+                                   shape=(n_rows, n_cols))
+
+
+def labels(name, n, first_id, units=('kg', 'MJ', 'unit')):
+    """ Label cell array of n rows: name, numeric ID, unit
+
+    Plain strings and integers, which generate_matdict() then wraps as
+    scipy.io.loadmat() does.
+    """
+    label = np.empty((n, 3), dtype=object)
+    label[:, 0] = ['{} {}'.format(name, i) for i in range(n)]
+    label[:, 1] = np.arange(first_id, first_id + n)
+    label[:, 2] = [units[i % len(units)] for i in range(n)]
+    return label
+
+
+def generate_matdict(n_background=2000, n_stressors=200, n_impacts=20,
+                     n_foreground=50, inputs_per_process=12,
+                     stressors_per_process=75, foreground_name='foreground',
+                     foreground_id=10**6, seed=0):
+    """ Synthetic LCA database, as read from a Matlab file by loadmat()
+
+    Sparsity follows that of ecoinvent: about a dozen technosphere inputs and
+    a few dozen elementary flows per process. Column sums of the technology
+    matrices stay below 0.5, such that (I - A) is always invertible. All
+    variables go through scipy.io.savemat() and loadmat() once (in memory),
+    such that labels come as the nested cell arrays of real Matlab files.
+
+    Args
+    ----
+        * n_background: number of background processes
+        * n_stressors: number of stressors (elementary flows)
+        * n_impacts: number of impact categories
+        * n_foreground: number of foreground processes
+        * inputs_per_process: non-zero technosphere inputs per process
+        * stressors_per_process: non-zero stressors per process
+        * foreground_name, foreground_id: name and first ID of foreground
+          processes, to generate distinct foregrounds
+        * seed: seed of random number generator
+
+    Returns
+    -------
+        dictionary with all variables read by extract_background() and
+        extract_foreground()
+    """
+    rng = np.random.default_rng(seed)
+    stressors_per_process = min(stressors_per_process, n_stressors)
+    n_all = n_background + n_foreground
+
+    matdict = {'PRO_header': HEADER,
+               'STR_header': HEADER,
+               'IMP_header': HEADER}
+    matdict['PRO_gen'] = labels('process', n_background, 1)
+    matdict['PRO_f'] = labels(foreground_name, n_foreground, foreground_id)
+    matdict['STR'] = labels('stressor', n_stressors, 10**5, ('kg', 'm3'))
+    matdict['IMP'] = labels('impact', n_impacts, 1, ('kg-eq',))
+
+    matdict['A_gen'] = random_sparse(n_background, n_background,
+                                     inputs_per_process, 0.5, rng)
+    matdict['F_gen'] = random_sparse(n_stressors, n_background,
+                                     stressors_per_process, 1.0, rng)
+    matdict['C'] = random_sparse(n_impacts, n_stressors,
+                                 max(1, n_stressors // 10), 1.0, rng)
+    matdict['y_gen'] = scipy.sparse.csc_matrix((n_background, 1))
+
+    # foreground relies on both foreground and background
+    A = random_sparse(n_all, n_foreground, inputs_per_process, 0.5, rng)
+    matdict['A_ff'] = A[:n_foreground].tocsc()
+    matdict['A_bf'] = A[n_foreground:].tocsc()
+    matdict['F_f'] = random_sparse(n_stressors, n_foreground,
+                                   stressors_per_process, 1.0, rng)
+    matdict['y_f'] = scipy.sparse.csc_matrix(np.ones((n_foreground, 1)))
+
+    buffer = io.BytesIO()
+    scipy.io.savemat(buffer, matdict)
+    buffer.seek(0)
+    return {key: value for key, value in scipy.io.loadmat(buffer).items()
+            if key in matdict}
+
+
+class SyntheticExtension(object):
+    """ Satellite account of SyntheticMRIO, with stressor coefficients (S) and
+    units, as a pymrio Extension """
+
+    def __init__(self, S, unit):
+        self.S = S
+        self.unit = unit
+
+
+class SyntheticMRIO(object):
+    """ Multi-regional IO table quacking like a pymrio IOSystem
+
+    Holds the technical coefficients (A, region x sector multiindex) and two
+    extensions: 'factor_inputs', with a single-level index, and 'emissions',
+    with a stressor x compartment multiindex, as pymrio's test system.
+
+    Args
+    ----
+        * n_regions, n_sectors: dimensions of the table
+        * n_emissions: number of emission stressors
+        * density: share of non-zero technical coefficients
+        * seed: seed of random number generator
+    """
+
+    def __init__(self, n_regions=10, n_sectors=40, n_emissions=400,
+                 density=0.3, seed=0):
+        rng = np.random.default_rng(seed)
+        index = pd.MultiIndex.from_product(
+                [['region {}'.format(i) for i in range(n_regions)],
+                 ['sector {}'.format(i) for i in range(n_sectors)]],
+                names=['region', 'sector'])
+        n = len(index)
+
+        A = rng.random((n, n))
+        A *= rng.random((n, n)) < density
+        A *= 0.5 / np.maximum(A.sum(axis=0), 1e-12)
+        self.A = pd.DataFrame(A, index=index, columns=index)
+        self.unit = pd.DataFrame('M.EUR', index=index, columns=['unit'])
+
+        factors = pd.Index(['Taxes', 'Wages', 'Operating surplus'],
+                           name='inputtype')
+        emissions = pd.MultiIndex.from_product(
+                [['emission {}'.format(i) for i in range(n_emissions // 2)],
+                 ['air', 'water']], names=['stressor', 'compartment'])
+        self.factor_inputs = SyntheticExtension(
+                pd.DataFrame(rng.random((len(factors), n)), index=factors,
+                             columns=index),
+                pd.DataFrame('M.EUR', index=factors, columns=['unit']))
+        S = rng.random((len(emissions), n))
+        S *= rng.random(S.shape) < density
+        self.emissions = SyntheticExtension(
+                pd.DataFrame(S, index=emissions, columns=index),
+                pd.DataFrame('kg', index=emissions, columns=['unit']))
+
+    def reset_all_to_coefficients(self):
+        """ Already only coefficients """
+        return self
+
+    def get_extensions(self, data=False):
+        """ Extensions, as objects if data, else as names """
+        for name in ('factor_inputs', 'emissions'):
+            yield getattr(self, name) if data else name
+
+
+# -----------------------MEASUREMENTS------------------------------------------
+#
+def measure(func, *args, **kwargs):
+    """ Run func, and measure its time and peak of memory allocations
+
+    Returns
+    -------
+        * output of func
+        * dictionary with 'time' in seconds and 'peak_memory' in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        __, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, {'time': elapsed, 'peak_memory': peak}
+
+
+def run_benchmarks(size='small', sparse=False, solver='lu', seed=0,
+                   verbose=True):
+    """ Generate synthetic system, and benchmark all steps of STEPS on it
+
+    Steps that raise an exception are reported with an 'error' instead of
+    measurements, and do not prevent the following steps from running.
+
+    Args
+    ----
+        * size: key of SIZES, or dictionary of the same parameters
+        * sparse, solver: settings of the LCAIO object
+        * seed: seed of random number generator
+        * verbose: print each step as it completes
+
+    Returns
+    -------
+        dictionary of measurements of each step, see measure()
+    """
+    dims = SIZES[size] if isinstance(size, str) else size
+    matdict = generate_matdict(dims['n_background'], dims['n_stressors'],
+                               dims['n_impacts'], dims['n_foreground'],
+                               seed=seed)
+    other = generate_matdict(dims['n_background'], dims['n_stressors'],
+                             dims['n_impacts'], dims['n_foreground'],
+                             foreground_name='appended',
+                             foreground_id=2 * 10**6, seed=seed + 1)
+    mrio = SyntheticMRIO(dims['n_regions'], dims['n_sectors'], seed=seed)
+
+    lcaio = pylcaio.LCAIO([0, 1], verbose=False, sparse=sparse,
+                          solver=solver)
+    appended = pylcaio.LCAIO([0, 1], verbose=False, sparse=sparse,
+                             solver=solver)
+    appended.extract_background(other)
+    appended.extract_foreground(other)
+
+    rng = np.random.default_rng(seed)
+    directory = tempfile.mkdtemp()
+
+    def properties():
+        lcaio.clear_cache()
+        for name in ('PRO', 'STR_all', 'IMP_all', 'A', 'F', 'C_all', 'y'):
+            getattr(lcaio, name)
+
+    def hybridize():
+        processes = lcaio.A_io_f.columns[:dims['n_hybridized']]
+        sectors = rng.integers(len(lcaio.A_io.index), size=len(processes))
+        for process, sector in zip(processes, sectors):
+            lcaio.hybridize_process(process, lcaio.A_io.index[sector],
+                                    rng.random(), verbose=False)
+
+    def export_parts():
+        lcaio.to_matfile(os.path.join(directory, 'background.mat'),
+                         foreground=False)
+        lcaio.to_matfile(os.path.join(directory, 'foreground.mat'),
+                         background=False)
+
+    def read_parts():
+        read = pylcaio.LCAIO([0, 1], verbose=False, sparse=sparse,
+                             solver=solver)
+        read.extract_background(os.path.join(directory, 'background.mat'))
+        read.extract_foreground(os.path.join(directory, 'foreground.mat'))
+
+    # unmeasured preparation of some steps
+    setups = {'read_matfile': export_parts}
+
+    steps = {'extract_background':
+                 lambda: lcaio.extract_background(matdict),
+             'extract_foreground':
+                 lambda: lcaio.extract_foreground(matdict),
+             'append_to_foreground':
+                 lambda: lcaio.append_to_foreground(appended, True),
+             'extract_io_background_from_pymrio':
+                 lambda: lcaio.extract_io_background_from_pymrio(mrio),
+             'properties': properties,
+             'hybridize_process': hybridize,
+             'calc_lifecycle': lambda: lcaio.calc_lifecycle('impacts'),
+             'to_matfile':
+                 lambda: lcaio.to_matfile(os.path.join(directory, 'all.mat')),
+             'read_matfile': read_parts}
+
+    results = {}
+    try:
+        for step in STEPS:
+            try:
+                if step in setups:
+                    setups[step]()
+                __, results[step] = measure(steps[step])
+            except Exception as e:
+                results[step] = {'error': '{}: {}'.format(type(e).__name__, e)}
+            if verbose:
+                print(format_result(step, results[step]))
+    finally:
+        for f in os.listdir(directory):
+            os.remove(os.path.join(directory, f))
+        os.rmdir(directory)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, min_time=0.1):
+    """ Find steps that got slower or more memory-hungry than in baseline
+
+    Args
+    ----
+        * results, baseline: outputs of run_benchmarks()
+        * tolerance: relative increase allowed [default 0.25]
+        * min_time: steps faster than this (seconds), in both results and
+                    baseline, are too noisy to be compared in time
+
+    Returns
+    -------
+        list of messages, one per regression, empty if none
+    """
+    regressions = []
+    for step, reference in baseline.items():
+        result = results.get(step, {})
+        if 'error' in result and 'error' not in reference:
+            regressions.append('{}: {}'.format(step, result['error']))
+            continue
+        if 'error' in result or 'error' in reference:
+            continue
+        if max(result['time'], reference['time']) >= min_time and \
+                result['time'] > (1 + tolerance) * reference['time']:
+            regressions.append('{}: time {:.3f} s, baseline {:.3f} s'.format(
+                    step, result['time'], reference['time']))
+        if result['peak_memory'] > (1 + tolerance) * reference['peak_memory']:
+            regressions.append('{}: peak memory {:.1f} MB, baseline {:.1f} '
+                               'MB'.format(step, result['peak_memory'] / 2**20,
+                                           reference['peak_memory'] / 2**20))
+    return regressions
+
+
+def format_result(step, result):
+    if 'error' in result:
+        return '{:<36} failed, {}'.format(step, result['error'])
+    return '{:<36} {:>9.3f} s {:>10.1f} MB'.format(
+            step, result['time'], result['peak_memory'] / 2**20)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--sparse', action='store_true',
+                        help='store matrices as SparseFrame')
+    parser.add_argument('--solver', default='lu')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='JSON file to compare against')
+    parser.add_argument('--save-baseline', metavar='FILE',
+                        help='write results as baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative increase allowed [default 0.25]')
+    args = parser.parse_args(argv)
+
+    settings = {'size': args.size, 'sparse': args.sparse,
+                'solver': args.solver, 'seed': args.seed}
+    results = run_benchmarks(args.size, args.sparse, args.solver, args.seed)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'settings': settings, 'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != settings:
+            print('Warning: baseline was run with settings {}'.format(
+                    baseline['settings']))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for message in regressions:
+            print('REGRESSION ' + message)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,8 @@ Dependencies
 - scipy
 - copy
 - logging
+- h5py (optional, only to read Matlab v7.3 files)
+- pyarrow (optional, only for save() and load())
 
 Though not strictly speaking a dependency, this module relies on the
 functionality of a pyMRIO object for reading in the IO tables.
@@ -20,11 +22,79 @@ functionality of a pyMRIO object for reading in the IO tables.
 import numpy as np
 import pandas as pd
 import scipy.io as sio
+import scipy.linalg
 import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+import concurrent.futures
+import contextlib
 import copy
+import functools
+import hashlib
+import heapq
+import inspect
+import itertools
+import json
 import logging
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+try:
+    import h5py
+except ImportError:
+    h5py = None
 # pylint: disable-msg=C0103
 
+# Variables of ARDA-style matlab files read by each extraction method
+_LABEL_KEYS = ('STR', 'STR_header', 'PRO_gen', 'PRO_header', 'IMP',
+               'IMP_header', 'PRO_f')
+_BACKGROUND_KEYS = ('A_gen', 'F_gen', 'C', 'y_gen')
+_FOREGROUND_KEYS = ('A_ff', 'A_bf', 'F_f', 'y_f')
+
+# Module logger; the root logger is left to the application
+_log = logging.getLogger(__name__)
+_LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def _memoized(func):
+    """ Property whose value is kept in the object's cache until invalidated
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def getter(self):
+        try:
+            return self._cache[name]
+        except KeyError:
+            with self._stage('assemble ' + name) as record:
+                value = self._cache[name] = func(self)
+            if record is not None:
+                record['sizes'] = {name: matrix_size(value)}
+            return value
+    return property(getter)
+
+
+def _instrumented(stage, blocks=()):
+    """ Method run as an instrumented stage, see LCAIO._stage(), recording
+    the sizes of the given blocks once done """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self._stage(stage) as record:
+                result = func(self, *args, **kwargs)
+            if record is not None and blocks:
+                record['sizes'] = {name: matrix_size(getattr(self, name))
+                                   for name in blocks}
+            return result
+        return wrapper
+    return decorator
+
 
 class LCAIO(object):
     """ Handles and hybridized LCA inventory matrices and EEIO tables
@@ -65,12 +135,56 @@ class LCAIO(object):
             _io_f: input-output X foreground
             ... and other combinations
 
+        Caching:
+            The concatenated labels and matrices (PRO, STR_all, IMP_all, A, F,
+            C_all) and the factorization of (I - A) are assembled once and
+            cached. The cache is invalidated automatically when one of the
+            attributes they depend on is reassigned or modified by an LCAIO
+            method. Call clear_cache() after modifying a matrix in place
+            oneself (e.g., a.A_ff.loc[i, j] = 1.0). Treat the concatenated
+            properties as read-only. The final demand y is not cached, and
+            y_f, y_b and y_io can be modified in place between calculations.
+
+            The whole-system matrices are stitched together by integer
+            offsets, from the positions of each group of labels kept in
+            PRO_registry, STR_registry and IMP_registry (LabelRegistry).
+
+        Storage:
+            By default, all matrices are held as dense Pandas DataFrames. In
+            sparse mode (sparse=True), all matrices (A_*, F_*, C*) are instead
+            held as SparseFrame objects, i.e., scipy.sparse matrices with row
+            and column labels, and the concatenated A, F and C_all are
+            assembled without ever densifying. Final demands (y_*) remain
+            DataFrames in both modes.
+
+            Label tables (PRO_*, STR*, IMP*) hold repeated strings as
+            categoricals and IDs as integers, see compact_labels(), and are
+            concatenated without expanding them, see concat_labels().
+
+            save() writes the whole object (blocks, labels, hybridization
+            table, double-counting filter, io_categories and settings) to a
+            directory or zip archive, which LCAIO.load() reads back in a
+            fraction of the time of the extraction methods.
+
+        Instrumentation:
+            Messages go to the module logger ('pylcaio') or, if verbose or
+            given a logfile, to a child logger of it that also writes to the
+            console or the file, see LCAIOLog. The level and handlers of the
+            module logger are never changed.
+
+            With instrument=True (or 'memory'), all extraction, assembly,
+            hybridization and solve stages get timed (and their peak memory
+            traced), along with the sizes, nnz and fill-in of the matrices
+            involved; see get_metrics().
+
     Object methods
     ---------------
     - extract_background()
     - extract_foreground()
     - extract_io_background_from_pymrio()
     - to_matfile()
+    - save() / LCAIO.load()
+    - save_shared_background() / attach_shared_background()
 
     - match_foreground_to_background()
     - delete_processes_foreground()
@@ -78,11 +192,21 @@ class LCAIO(object):
     - increase_foreground_process_ids()
 
     - hybridize_process()
+    - build_doublecounting_filter()
+    - hybridize_all()
     - calc_lifecycle()
+    - calc_lifecycle_batch()
+    - contribution_analysis()
+    - structural_path_analysis()
+    - run_scenarios()
+
+    See also MonteCarlo, for uncertainty propagation.
 
     """
 
-    def __init__(self, index_columns=[1], verbose=True):
+    def __init__(self, index_columns=[1], verbose=True, sparse=False,
+                 solver='lu', solver_options=None, logfile=None,
+                 instrument=False):
         """ Define LCAIO object
 
         Args
@@ -91,10 +215,43 @@ class LCAIO(object):
                            [default 1]
             verbose: whether to have logging on stream handler 
                      [default true]
+            sparse: whether to store matrices as labelled sparse matrices
+                    (SparseFrame) instead of dense DataFrames
+                    [default false]
+            solver: how lifecycle calculations solve (I - A) x = y
+                    - 'lu': one sparse LU factorization of whole system
+                    - 'block': separate factorizations of foreground,
+                               background and IO blocks, see _solve_blocks()
+                    - 'neumann', 'gmres' or 'bicgstab': iterative solvers,
+                               see _solve_iterative()
+                    [default 'lu']
+            solver_options: dictionary of options for iterative solvers
+                    - 'tol': relative tolerance on residual [default 1e-8]
+                    - 'maxiter': maximum number of iterations [default 1000]
+                    - 'preconditioner': 'ilu', 'jacobi' or None, for Krylov
+                                        solvers [default 'ilu']
+                    - 'incremental': with the 'lu' solver, keep the last
+                                     factorization and update it with
+                                     low-rank corrections after edits to A,
+                                     see LowRankUpdate [default False]
+                    - 'max_rank': number of changed columns of A above
+                                  which the incremental mode re-factorizes
+                                  [default 50]
+                    - 'prune': with the 'lu' solver, only factorize and solve
+                               the processes reachable from the final
+                               demand, see reachable() [default False]
+            logfile: file to also write the log to [default None]
+            instrument: record time (True), or time and peak memory
+                        ('memory'), of all extraction, assembly,
+                        hybridization and solve stages, see get_metrics()
+                        [default False]
         """
 
         # INITIALIZE ATTRIBUTES
 
+        # cache of assembled properties and factorization
+        self._cache = {}
+
         # extended Labels
         self.PRO_f = pd.DataFrame()
         self.PRO_b = pd.DataFrame()
@@ -119,6 +276,19 @@ class LCAIO(object):
 
         self._arda_default_labels = index_columns
         self._ardaId_column = 1
+        self.sparse = sparse
+        self.solver = solver
+        self.solver_options = {'tol': 1e-8,
+                               'maxiter': 1000,
+                               'preconditioner': 'ilu',
+                               'incremental': False,
+                               'max_rank': 50,
+                               'prune': False}
+        if solver_options is not None:
+            self.solver_options.update(solver_options)
+
+        # iterations, residuals and timing of last iterative solve
+        self.solver_info = {}
 
         self.A_io = pd.DataFrame()
         self.A_io_f = pd.DataFrame()
@@ -129,80 +299,270 @@ class LCAIO(object):
 
         self.io_categories = {}
 
+        # Share of each input sector (rows) removed as double counted from
+        # the EEIO complement of each sector (columns), sector level, see
+        # build_doublecounting_filter()
+        self.doublecounting = pd.DataFrame()
+
         self.hyb = pd.DataFrame(columns=['process_index',
                                          'io_index',
                                          'price_per_fu'])
 
-        # DEFINE LOG TOOL
-        self.log = logging.getLogger()
-        self.log.setLevel(logging.INFO)
-        self.log.handlers = []                            # reset handlers
-        if verbose:
-            ch = logging.StreamHandler()
-            ch.setLevel(logging.INFO)
-        fh = logging.FileHandler('lcaio.log')
-        fh.setLevel(logging.INFO)
-        aformat = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        formatter = logging.Formatter(aformat)
-        fh.setFormatter(formatter)
-        self.log.addHandler(fh)
-        if verbose:
-            ch.setFormatter(formatter)
-            self.log.addHandler(ch)
+
+        # DEFINE LOG TOOL, on the module logger, see LCAIOLog
+        self.log = LCAIOLog(verbose, logfile)
+
+        # Records of instrumented stages, and stack of those running
+        self.instrument = instrument
+        self.metrics = []
+        self._stages = []
+
+    # Label tables and blocks of a whole LCAIO object, see save()
+    _LABEL_TABLES = ('PRO_f', 'PRO_b', 'STR', 'IMP', 'PRO_io', 'STR_io',
+                     'IMP_io')
+    _BLOCKS = ('A_ff', 'A_bf', 'A_bb', 'A_io', 'A_io_f', 'F_f', 'F_b', 'F_io',
+               'F_io_f', 'C', 'C_io', 'y_f', 'y_b', 'y_io', 'doublecounting')
+    _DEMAND_BLOCKS = ('y_f', 'y_b', 'y_io')
+    _SHARED_LABEL_TABLES = ('PRO_b', 'STR', 'IMP', 'PRO_io', 'STR_io',
+                            'IMP_io')
+    _SHARED_BLOCKS = ('A_bb', 'F_b', 'C', 'y_b', 'A_io', 'F_io', 'C_io',
+                      'y_io')
+
+    # Cached items, and the attributes they are assembled from
+    _PRO_LABELS = ('PRO_f', 'PRO_b', 'PRO_io')
+    _STR_LABELS = ('STR', 'STR_io')
+    _IMP_LABELS = ('IMP', 'IMP_io')
+    _CACHE_DEPENDENCIES = {
+        'PRO': _PRO_LABELS,
+        'STR_all': _STR_LABELS,
+        'IMP_all': _IMP_LABELS,
+        'A': ('A_ff', 'A_bf', 'A_bb', 'A_io_f', 'A_io', 'sparse'
+              ) + _PRO_LABELS,
+        'lu': ('A_ff', 'A_bf', 'A_bb', 'A_io_f', 'A_io', 'sparse'
+               ) + _PRO_LABELS,
+        'lu_pruned': ('A_ff', 'A_bf', 'A_bb', 'A_io_f', 'A_io', 'sparse'
+                      ) + _PRO_LABELS,
+        'I_A': ('A_ff', 'A_bf', 'A_bb', 'A_io_f', 'A_io', 'sparse'
+                ) + _PRO_LABELS,
+        'preconditioner': ('A_ff', 'A_bf', 'A_bb', 'A_io_f', 'A_io', 'sparse'
+                           ) + _PRO_LABELS,
+        'lu_ff': ('A_ff', 'PRO_f', 'sparse'),
+        'lu_bb': ('A_bb', 'PRO_b', 'sparse'),
+        'lu_io': ('A_io', 'PRO_io', 'sparse'),
+        'A_bf_block': ('A_bf', 'PRO_f', 'PRO_b', 'sparse'),
+        'A_io_f_block': ('A_io_f', 'PRO_f', 'PRO_io', 'sparse'),
+        'sector_index': ('A_io',),
+        'category_masks': ('A_io',),
+        'F': ('F_f', 'F_b', 'F_io_f', 'F_io', 'sparse'
+              ) + _PRO_LABELS + _STR_LABELS,
+        'C_all': ('C', 'C_io', 'sparse') + _STR_LABELS + _IMP_LABELS,
+        'PRO_registry': _PRO_LABELS,
+        'STR_registry': _STR_LABELS,
+        'IMP_registry': _IMP_LABELS,
+        }
+    _WATCHED_ATTRIBUTES = frozenset(a for deps in _CACHE_DEPENDENCIES.values()
+                                    for a in deps)
+
+    def __setattr__(self, name, value):
+        if name in self._WATCHED_ATTRIBUTES:
+            self._invalidate(name)
+        object.__setattr__(self, name, value)
+
+    def __getstate__(self):
+        # Factorizations cannot be pickled (or deep-copied); start afresh
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+    def _invalidate(self, *names):
+        """ Drop all cached items that depend on the given attributes """
+        cache = self.__dict__.get('_cache')
+        if not cache:
+            return
+        for key, dependencies in self._CACHE_DEPENDENCIES.items():
+            if any(name in dependencies for name in names):
+                cache.pop(key, None)
+
+    def clear_cache(self):
+        """ Drop all cached properties and factorizations
+
+        Only needed after modifying a matrix or label in place, outside of
+        LCAIO methods.
+        """
+        self._cache.clear()
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        """ Time, and optionally trace peak memory of, a stage of calculation
+
+        Stages can be nested, e.g., a factorization within a lifecycle
+        calculation; the peak memory of each stage includes that of the
+        stages it contains, and is counted from the memory allocated when it
+        started. Before Python 3.9, tracemalloc cannot reset its peak: the
+        peak of a stage is then only known if it exceeds all previous ones,
+        and is otherwise underestimated by the memory allocated at its end,
+        see _stage_peak().
+
+        Yields
+        ------
+            the record of the stage, appended to self.metrics, which the
+            stage can complete; or None if self.instrument is off
+        """
+        if not self.instrument:
+            yield None
+            return
+
+        record = {'stage': name, 'depth': len(self._stages)}
+        frame = {}
+        memory = self.instrument == 'memory'
+        if memory:
+            frame['started'] = not tracemalloc.is_tracing()
+            if frame['started']:
+                tracemalloc.start()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stages:
+                parent = self._stages[-1]
+                parent['peak'] = max(parent['peak'],
+                                     _stage_peak(parent, current, peak))
+            if _RESET_PEAK:
+                tracemalloc.reset_peak()
+                frame['baseline'] = -1
+            else:
+                frame['baseline'] = peak
+            frame['start'] = frame['peak'] = current
+        self._stages.append(frame)
+        self.metrics.append(record)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['time'] = time.perf_counter() - start
+            self._stages.pop()
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(frame['peak'], _stage_peak(frame, current, peak))
+                record['peak_memory'] = peak - frame['start']
+                if self._stages:
+                    parent = self._stages[-1]
+                    parent['peak'] = max(parent['peak'], peak)
+                if frame['started']:
+                    tracemalloc.stop()
+
+    def get_metrics(self, as_json=False):
+        """ Metrics of instrumented stages, since creation or reset_metrics()
+
+        Args
+        ----
+            as_json: return a JSON string instead of a dictionary
+                     [default False]
+
+        Returns
+        -------
+            dictionary with:
+            * 'stages': records of all stages, in order of start, each with
+              'stage' (name), 'depth' (of nesting), 'time' (seconds),
+              'peak_memory' (bytes, with instrument='memory'), and, where
+              relevant, 'sizes' of matrices (shape, nnz, density and, for
+              factorizations, fill-in) or 'solver_info'
+            * 'totals': number of calls and total time of each stage
+        """
+        totals = {}
+        for record in self.metrics:
+            total = totals.setdefault(record['stage'], {'calls': 0,
+                                                        'time': 0.0})
+            total['calls'] += 1
+            total['time'] += record.get('time', 0.0)
+        metrics = {'stages': copy.deepcopy(self.metrics), 'totals': totals}
+        if as_json:
+            return json.dumps(metrics,
+                              default=lambda x: np.asarray(x).tolist())
+        return metrics
+
+    def reset_metrics(self):
+        """ Forget metrics of all previous stages, e.g., between runs """
+        self.metrics = []
 
 #=============================================================================
 # PROPERTIES
 #=============================================================================
-    @property
+    @_memoized
     def PRO(self):
         """ Process/sector labels for whole system """
-        pro =  pd.concat([self.PRO_f, self.PRO_b, self.PRO_io], axis=0)
-        return reorder_cols(pro.fillna(''))
+        return reorder_cols(concat_labels([self.PRO_f, self.PRO_b,
+                                           self.PRO_io]))
 
-    @property
+    @_memoized
     def STR_all(self):
         """
         Extensions (stressor, factors, elementary flow) labels for whole system
         """
-        str_all = pd.concat([self.STR, self.STR_io], axis=0)
-        return reorder_cols(str_all.fillna(''))
+        return reorder_cols(concat_labels([self.STR, self.STR_io]))
 
-    @property
+    @_memoized
     def IMP_all(self):
         """ Impact labels for whole system """
-        imp = pd.concat([self.IMP, self.IMP_io], axis=0)
-        return reorder_cols(imp.fillna(''))
-
-    @property
+        return reorder_cols(concat_labels([self.IMP, self.IMP_io]))
+
+    @_memoized
+    def PRO_registry(self):
+        """ Integer positions of all processes/sectors, see LabelRegistry """
+        return LabelRegistry([('PRO_f', self.PRO_f.index),
+                              ('PRO_b', self.PRO_b.index),
+                              ('PRO_io', self.PRO_io.index)])
+
+    @_memoized
+    def STR_registry(self):
+        """ Integer positions of all stressors, see LabelRegistry """
+        return LabelRegistry([('STR', self.STR.index),
+                              ('STR_io', self.STR_io.index)])
+
+    @_memoized
+    def IMP_registry(self):
+        """ Integer positions of all impacts, see LabelRegistry """
+        return LabelRegistry([('IMP', self.IMP.index),
+                              ('IMP_io', self.IMP_io.index)])
+
+    @_memoized
     def A(self):
         """ Technical coefficient matrix for whole system """
-        a = pd.concat([     i2s(self.A_ff),
-                 pd.concat([i2s(self.A_bf), i2s(self.A_bb)], axis=1),
-                 pd.concat([i2s(self.A_io_f), i2s(self.A_io)], axis=1)], axis=0
-                 )
-        return a.reindex_axis(self.PRO.index, 0).reindex_axis(self.PRO.index,1
-                                                              ).fillna(0.0)
-    @property
+        return self.__make_block(self.__assemble_A(), self.PRO.index,
+                                 self.PRO.index)
+
+    @_memoized
     def F(self):
         """ Normalized extensions for whole system"""
-        f = pd.concat([pd.concat([i2s(self.F_f), i2s(self.F_b)], axis=1),
-                      pd.concat([i2s(self.F_io_f), i2s(self.F_io)], axis=1)],
-                     axis=0)
-        return f.reindex_axis(self.STR_all.index, 0).reindex_axis(self.PRO.index,1
-                ).fillna(0.0)
+        return self.__make_block(self.__assemble_F(), self.STR_all.index,
+                                 self.PRO.index)
 
-    @property
+    @_memoized
     def C_all(self):
         """ Characterisation factors for whole system """
-        return concat_keep_order([i2s(self.C), i2s(self.C_io)],
-                                 i2s(self.STR_all).index,
-                                 order_axis=[1])
+        C_all = self.__make_block(self.__assemble_C(), self.IMP_all.index,
+                                  self.STR_all.index)
+        if self.sparse:
+            return C_all
+        return i2s(C_all)
 
     @property
     def y(self):
-        """ Final demand for whole system """
-        y_pro =  pd.concat([self.y_f, self.y_b, self.y_io], axis=0)
-        return y_pro.reindex_axis(self.PRO.index, axis=0).fillna(0.0)
+        """ Final demand for whole system
+
+        Not cached, unlike A, F and C_all: a cheap stack of vectors, always
+        up to date with y_f, y_b and y_io, even if modified in place.
+        """
+        blocks = [(block, name) for block, name in ((self.y_f, 'PRO_f'),
+                                                    (self.y_b, 'PRO_b'),
+                                                    (self.y_io, 'PRO_io'))
+                  if len(block.columns)]
+        if not blocks:
+            return pd.DataFrame(index=self.PRO.index)
+        columns = _union_labels([block.columns for block, __ in blocks])
+        registry = LabelRegistry([('y', columns)])
+        matrix = self.PRO_registry.assemble(
+                [(block, name, 'y') for block, name in blocks], registry)
+        return pd.DataFrame(matrix.toarray(), index=self.PRO.index,
+                            columns=columns).fillna(0.0)
 
 #=============================================================================
 # METHODS
@@ -214,58 +574,93 @@ class LCAIO(object):
         """Extracts labels (PRO, STR, etc.) from matlab dictionnary"""
 
         if  (overwrite or len(self.STR) == 0) and 'STR' in matdict:
-            STR = mine_nested_array(matdict['STR'])
+            STR = decode_labels(matdict['STR'])
             self.STR = pd.DataFrame(
                             data=STR,
                             index=STR[:, self._arda_default_labels].T.tolist()
                             )
             try:
-                STR_header = mine_nested_array(matdict['STR_header'])
+                STR_header = decode_labels(matdict['STR_header'])
                 self.STR.columns = extract_header(STR_header)
             except:
                 pass
+            self.STR = compact_labels(self.STR)
 
 
         if  (overwrite or len(self.PRO_b) == 0) and 'PRO_gen' in matdict:
-            PRO_b = mine_nested_array(matdict['PRO_gen'])
-            PRO_header = mine_nested_array(matdict['PRO_header'])
-            self.PRO_b = pd.DataFrame(
+            PRO_b = decode_labels(matdict['PRO_gen'])
+            PRO_header = decode_labels(matdict['PRO_header'])
+            self.PRO_b = compact_labels(pd.DataFrame(
                     data=PRO_b,
                     columns = extract_header(PRO_header),
                     index=PRO_b[:, self._arda_default_labels].T.tolist()
-                    )
+                    ))
 
         if  (overwrite or len(self.IMP) == 0) and 'IMP' in matdict:
-            IMP = mine_nested_array(matdict['IMP'])
-            IMP_header = mine_nested_array(matdict['IMP_header'])
-            self.IMP = pd.DataFrame(
+            IMP = decode_labels(matdict['IMP'])
+            IMP_header = decode_labels(matdict['IMP_header'])
+            self.IMP = compact_labels(pd.DataFrame(
                     data=IMP,
                     columns=extract_header(IMP_header),
                     index=IMP[:, self._arda_default_labels].T.tolist()
-                    )
+                    ))
 
         if  (overwrite or len(self.PRO_f) == 0) and 'PRO_f' in matdict:
-            PRO_f = mine_nested_array(matdict['PRO_f'])
+            PRO_f = decode_labels(matdict['PRO_f'])
             try:
                 PRO_header = extract_header(
-                        mine_nested_array(matdict['PRO_header']))
+                        decode_labels(matdict['PRO_header']))
             except:
                 if len(self.PRO_b.columns) == PRO_f.shape[1]:
                     PRO_header = self.PRO_b.columns
                 else:
                     raise Exception("Cannot read PRO_header")
-            self.PRO_f = pd.DataFrame(
+            self.PRO_f = compact_labels(pd.DataFrame(
                     data = PRO_f,
                     index = PRO_f[:, self._arda_default_labels].T.tolist(),
                     columns = PRO_header
-                    )
-
+                    ))
+
+    def __assemble_A(self):
+        """ Whole-system A as CSC matrix, by offsets of PRO_registry """
+        return self.PRO_registry.assemble(
+                [(self.A_ff, 'PRO_f', 'PRO_f'),
+                 (self.A_bf, 'PRO_b', 'PRO_f'),
+                 (self.A_bb, 'PRO_b', 'PRO_b'),
+                 (self.A_io_f, 'PRO_io', 'PRO_f'),
+                 (self.A_io, 'PRO_io', 'PRO_io')])
+
+    def __assemble_F(self):
+        """ Whole-system F as CSC matrix, by offsets of STR_registry """
+        return self.STR_registry.assemble(
+                [(self.F_f, 'STR', 'PRO_f'),
+                 (self.F_b, 'STR', 'PRO_b'),
+                 (self.F_io_f, 'STR_io', 'PRO_f'),
+                 (self.F_io, 'STR_io', 'PRO_io')],
+                self.PRO_registry)
+
+    def __assemble_C(self):
+        """ Whole-system C as CSC matrix, by offsets of IMP_registry """
+        return self.IMP_registry.assemble([(self.C, 'IMP', 'STR'),
+                                           (self.C_io, 'IMP_io', 'STR_io')],
+                                          self.STR_registry)
+
+    def __make_block(self, matrix, index, columns):
+        """ Wrap a (sparse) matrix as a DataFrame or SparseFrame, as per mode"""
+        if self.sparse:
+            return SparseFrame(matrix, index, columns)
+        if scipy.sparse.issparse(matrix):
+            matrix = matrix.toarray()
+        return pd.DataFrame(data=matrix, index=index, columns=columns)
+
+    @_instrumented('extract_background', ('A_bb', 'F_b', 'C'))
     def extract_background(self, datasource, overwrite=True):
         """ Extract LCA background, from Matlab .mat file or similar
 
         Args
         ----
-        * datasource: either filename of Matlab .mat file
+        * datasource: either filename of Matlab .mat file (any version,
+                      including v7.3/HDF5)
                       OR
                       name of dictionnary produced by scipy.load_mat()
         * overwrite: By default, overwrite any previously read label in the
@@ -273,24 +668,20 @@ class LCAIO(object):
 
         """
 
-        try:
-            # Treat datasource as filename
-            matdict = sio.loadmat(datasource)
-        except OSError:
-            # Treat datasource as matlab dictionnary
-            matdict = datasource
+        # Only read the variables needed, from file or dictionnary
+        matdict = open_matsource(datasource, _LABEL_KEYS + _BACKGROUND_KEYS)
 
         self.__extract_labels_from_matdict(matdict, overwrite)
 
-        self.F_b = pd.DataFrame(data=matdict['F_gen'].toarray(),
-                                index=self.STR.index,
-                                columns=self.PRO_b.index)
-        self.A_bb = pd.DataFrame(data=matdict['A_gen'].toarray(),
-                                 index=self.PRO_b.index,
-                                 columns=self.PRO_b.index)
-        self.C = pd.DataFrame(data=matdict['C'].toarray(),
-                              index=self.IMP.index,
-                              columns=self.STR.index)
+        self.F_b = self.__make_block(matdict['F_gen'],
+                                     self.STR.index,
+                                     self.PRO_b.index)
+        self.A_bb = self.__make_block(matdict['A_gen'],
+                                      self.PRO_b.index,
+                                      self.PRO_b.index)
+        self.C = self.__make_block(matdict['C'],
+                                   self.IMP.index,
+                                   self.STR.index)
         try:
             self.y_b = pd.DataFrame(data=matdict['y_gen'].toarray(),
                                     index=self.PRO_b.index)
@@ -299,12 +690,14 @@ class LCAIO(object):
             self.y_b = pd.DataFrame(data=np.zeros((self.A_bb.shape[0], 1)),
                                     index=self.PRO_b.index)
 
+    @_instrumented('extract_foreground', ('A_ff', 'A_bf', 'F_f'))
     def extract_foreground(self, datasource, overwrite=True):
         """ Extract LCA foreground, from Matlab .mat file or similar
 
         Args
         ----
-        * datasource: either filename of Matlab .mat file
+        * datasource: either filename of Matlab .mat file (any version,
+                      including v7.3/HDF5)
                       OR
                       name of dictionnary produced by scipy.load_mat()
         * overwrite: By default, overwrite any previously read label in the
@@ -312,26 +705,21 @@ class LCAIO(object):
 
         """
 
-        try:
-            # Treat datasource as filename
-            matdict = sio.loadmat(datasource)
-        except OSError:
-            # Treat datasource as matlab dictionnary
-            matdict = datasource
-
+        # Only read the variables needed, from file or dictionnary
+        matdict = open_matsource(datasource, _LABEL_KEYS + _FOREGROUND_KEYS)
 
         self.__extract_labels_from_matdict(matdict, overwrite)
 
-        self.A_ff = pd.DataFrame(data=matdict['A_ff'].toarray(),
-                                 index=self.PRO_f.index,
-                                 columns=self.PRO_f.index)
-        self.A_bf = pd.DataFrame(data=matdict['A_bf'].toarray(),
-                                 index=self.PRO_b.index,
-                                 columns=self.PRO_f.index)
+        self.A_ff = self.__make_block(matdict['A_ff'],
+                                      self.PRO_f.index,
+                                      self.PRO_f.index)
+        self.A_bf = self.__make_block(matdict['A_bf'],
+                                      self.PRO_b.index,
+                                      self.PRO_f.index)
 
-        self.F_f = pd.DataFrame(data=matdict['F_f'].toarray(),
-                                index=self.STR.index,
-                                columns=self.PRO_f.index)
+        self.F_f = self.__make_block(matdict['F_f'],
+                                     self.STR.index,
+                                     self.PRO_f.index)
 
         try:
             self.y_f = pd.DataFrame(data=matdict['y_f'].toarray(),
@@ -343,6 +731,7 @@ class LCAIO(object):
 
 
 
+    @_instrumented('extract_io_background_from_pymrio', ('A_io', 'F_io'))
     def extract_io_background_from_pymrio(self, mrio, pro_name_cols=None,
             str_name_cols=None,reconcile=True):
         """ Extract EEIO matrices from pyMRIO object
@@ -363,13 +752,14 @@ class LCAIO(object):
             mrio.unit.loc[:,'UNIT'] = 'M.EUR.'
 
 
-        self.A_io = mrio.A.copy()
-
+        if self.sparse:
+            self.A_io = SparseFrame(mrio.A.values, mrio.A.index,
+                                    mrio.A.columns)
+        else:
+            self.A_io = mrio.A.copy()
 
         # get "process labels", add units as last column
-        PRO_io = np.hstack((
-                    np.array([list(r) for r in self.A_io.index]),
-                    mrio.unit.values))
+        PRO_io = np.hstack((_label_array(self.A_io.index), mrio.unit.values))
         PRO_header = [x.upper() for x in mrio.A.index.names]
         PRO_header = PRO_header + ['UNIT']
 
@@ -383,35 +773,37 @@ class LCAIO(object):
         if reconcile:
             PRO_io, PRO_header= self.__reconcile_ids(PRO_io, self.PRO, PRO_header)
 
-        self.PRO_io = pd.DataFrame(PRO_io,
+        self.PRO_io = compact_labels(pd.DataFrame(PRO_io,
                                    #index=PRO_io[:,self._arda_default_labels].T.tolist(),
                                    index=self.A_io.index,
-                                   columns = PRO_header)
+                                   columns = PRO_header))
 
         # Check if we have a mix of single-index and multi-index dataframes in
-        # the MRIO extensions
-        bo_singleIndex = False
-        max_names = 1
-        for i in mrio.get_extensions(True):
-            names_length = len(i.S.index.names)
-            if names_length > max_names:
-                max_names = names_length
-                max_headers = i.S.index.names
-            elif names_length == 1:
-                bo_singleIndex=True
-
-        # Combine all extensions as one
-        units_str=pd.DataFrame([])
-        for i in mrio.get_extensions(True):
-            i.S.index = augment_index(i.S.index, max_names)
-            self.F_io = pd.concat([self.F_io, i.S])
-            units_str = pd.concat([units_str, i.unit])
-            self.F_io.index.names = max_headers
-
+        # the MRIO extensions, and find the widest
+        extensions = list(mrio.get_extensions(True))
+        max_names = max(len(i.S.index.names) for i in extensions)
+        max_headers = [i.S.index.names for i in extensions
+                       if len(i.S.index.names) == max_names][0]
+
+        # Combine all extensions as one, in a single pass
+        indexes = [augment_index(i.S.index, max_names) for i in extensions]
+        index = indexes[0].append(indexes[1:])
+        index.names = max_headers
+        values = [i.S.values if i.S.columns.equals(self.A_io.columns)
+                  else i.S.reindex(columns=self.A_io.columns).values
+                  for i in extensions]
+        if self.sparse:
+            self.F_io = SparseFrame(
+                    scipy.sparse.vstack([scipy.sparse.csc_matrix(i)
+                                         for i in values], format='csc'),
+                    index, self.A_io.columns)
+        else:
+            self.F_io = pd.DataFrame(np.vstack(values), index=index,
+                                     columns=self.A_io.columns)
+        units_str = pd.concat([i.unit for i in extensions])
 
         # get STR labels and units (as last column)
-        STR_io = np.hstack((np.array([list(r) for r in self.F_io.index]),
-                            units_str.values))
+        STR_io = np.hstack((_label_array(self.F_io.index), units_str.values))
 
         # get STR header
         STR_header = [x.upper() for x in self.F_io.index.names]
@@ -428,27 +820,29 @@ class LCAIO(object):
         if reconcile:
             STR_io, STR_header= self.__reconcile_ids(STR_io, self.STR, STR_header)
 
-        self.STR_io = pd.DataFrame(
+        self.STR_io = compact_labels(pd.DataFrame(
                 STR_io,
                 #index=STR_io[:, self._arda_default_labels].T.tolist(),
                 index=self.F_io.index,
                 columns=STR_header
-                )
+                ))
 
-        self.A_io_f = pd.DataFrame(index=self.A_io.index,
-                                   columns=self.A_ff.columns).fillna(0.0)
-
-        self.F_io_f = pd.DataFrame(index=self.F_io.index,
-                                   columns=self.A_ff.columns).fillna(0.0)
+        self.__reset_foreground_io()
 
         # Define an empty final demand vector
         self.y_io = pd.DataFrame(data=np.zeros((self.A_io.shape[0], 1)),
                                 index=self.PRO_io.index)
         self.log.info("Defined empty final demand from IO, y_io")
 
+        # Index sectors once, for hybridization
+        if 'sector' in self.A_io.index.names:
+            self.sector_index('sector')
+
+    @_instrumented('extract_exiobase2_characterisation_factors', ('C_io',))
     def extract_exiobase2_characterisation_factors(self,
             char_filename='characterisation_CREEA_version2.2.0.xlsx',
-            xlschar_param=None, name_cols=[0], reconcile=True):
+            xlschar_param=None, name_cols=[0], reconcile=True,
+            cache_dir=None):
         """Specific method for reading Exiobase2 characterisation factors
 
         Args
@@ -459,6 +853,9 @@ class LCAIO(object):
             - name_cols:        List of columns to concatenate in the
                                 compilation of a fullname for each impact
                                     [default, column 0]
+            - cache_dir:        Directory where to keep parsed spreadsheets,
+                                see read_characterisation()
+                                    [default None, no caching]
 
         """
 
@@ -474,25 +871,7 @@ class LCAIO(object):
                     'Q_materials':
                         (['impact', 'unit'], ['stressor'], [1] , None)}
 
-            # find widest index and columns
-            max_cols=0
-            max_index=0
-            for key in xlschar_param.keys():
-                index_width = len(xlschar_param[key][0])
-                if index_width > max_index:
-                    max_index = copy.deepcopy(index_width)
-                col_width = len(xlschar_param[key][1])
-                if col_width > max_cols:
-                    max_cols = copy.deepcopy(col_width)
-
-
-        C = pd.DataFrame()
-        for key in xlschar_param.keys():
-            par = xlschar_param[key]
-            c = extract_char(char_filename, key, par[0], par[1], par[2], par[3])
-            c.index = augment_index(c.index, max_index)
-            c.columns = augment_index(c.columns, max_cols)
-            C = pd.concat([C, c], join='outer')
+        C = read_characterisation(char_filename, xlschar_param, cache_dir)
 
         # characterized stressors that would get lost in processing?
         diff = set(C.columns) - set(self.F_io.index)
@@ -512,6 +891,9 @@ class LCAIO(object):
              pass
 
         self.C_io = C.reindex_axis(self.F_io.index, axis='columns').fillna(0)
+        if self.sparse:
+            self.C_io = SparseFrame(self.C_io.values, self.C_io.index,
+                                    self.C_io.columns)
         IMP_header = extract_header(self.C_io.index.names)
         IMP = np.array([list(i) for i in self.C_io.index.values.tolist()],
                        dtype=object)
@@ -519,67 +901,319 @@ class LCAIO(object):
         if reconcile:
             IMP, IMP_header = self.__reconcile_ids(IMP, self.IMP, IMP_header)
 
-        self.IMP_io = pd.DataFrame(index = self.C_io.index,
-                                   columns = IMP_header,
-                                   data = IMP)
+        self.IMP_io = compact_labels(pd.DataFrame(index = self.C_io.index,
+                                                  columns = IMP_header,
+                                                  data = IMP))
         # todo: must have fullname, and numerical id
         #       UNIT, not unit
         #       NAME, not impact?
 
-    def to_matfile(self, filename, foreground=True, background=True):
+    @_instrumented('to_matfile')
+    def to_matfile(self, filename, foreground=True, background=True,
+                   do_compression=False):
         """ Export foreground, background, or whole system to Matlab mat-file
 
+        The whole system is assembled as sparse matrices directly from the
+        individual blocks, and written one variable at a time, so that neither
+        the dense whole-system matrices nor all sparse ones at once need to be
+        held in memory.
+
         Args
         ----
             filename
             foreground: by default, export foreground
             background: by default, export background
+            do_compression: whether to compress the mat-file
+                            [default False]
 
         """
 
-        csc = scipy.sparse.csc_matrix
-
         if foreground and not background:
-            sio.savemat(filename, {
-                    'A_ff':         scipy.sparse.csc_matrix(self.A_ff.values),
-                    'A_bf':         scipy.sparse.csc_matrix(self.A_bf.values),
-                    'F_f':          scipy.sparse.csc_matrix(self.F_f.values),
-                    'y_f':          scipy.sparse.csc_matrix(self.y_f.values),
+            variables = {
+                    'A_ff':         to_csc(self.A_ff),
+                    'A_bf':         to_csc(self.A_bf),
+                    'F_f':          to_csc(self.F_f),
+                    'y_f':          to_csc(self.y_f),
                     'PRO_f':        self.PRO_f.values,
                     'PRO_gen':      self.PRO_b.values,
                     'STR':          self.STR.values,
                     'PRO_header':   np.atleast_2d(self.PRO_f.columns.values),
                     'STR_header':   np.atleast_2d(self.STR.columns.values),
                     'IMP_header':   np.atleast_2d(self.IMP.columns.values)
-                   })
+                   }.items()
         elif background and not foreground:
-            sio.savemat(filename, {
-                    'A_gen': scipy.sparse.csc_matrix(self.A_bb.values),
-                    'F_gen': scipy.sparse.csc_matrix(self.F_b.values),
-                    'C': scipy.sparse.csc_matrix(self.C.values),
-                    'y_gen': scipy.sparse.csc_matrix(self.y_b.values),
+            variables = {
+                    'A_gen': to_csc(self.A_bb),
+                    'F_gen': to_csc(self.F_b),
+                    'C': to_csc(self.C),
+                    'y_gen': to_csc(self.y_b),
                     'PRO_gen': self.PRO_b.values,
                     'STR': self.STR.values,
                     'IMP': self.IMP.values,
                     'PRO_header': np.atleast_2d(self.PRO_b.columns.values),
                     'STR_header': np.atleast_2d(self.STR.columns.values),
                     'IMP_header': np.atleast_2d(self.IMP.columns.values)
-                       })
+                       }.items()
+
+        else:
+            variables = self.__system_variables()
+
+        write_matfile(filename, variables, do_compression)
+
+    def __system_variables(self):
+        """ Variables of whole system, assembled one at a time for export
+
+        Same as the properties A, F, C_all, assembled in sparse format by
+        the same label registries, but without getting cached.
+        """
+        yield 'A_gen', self.__assemble_A()
+        yield 'F_gen', self.__assemble_F()
+        yield 'C', self.__assemble_C()
+        yield 'y_gen', to_csc(self.y)
+        yield 'PRO_gen', self.PRO.values
+        yield 'STR', self.STR_all.values
+        yield 'IMP', self.IMP_all.values
+        yield 'PRO_header', np.atleast_2d(self.PRO.columns.values)
+        yield 'STR_header', np.atleast_2d(self.STR_all.columns.values)
+        yield 'IMP_header', np.atleast_2d(self.IMP_all.columns.values)
+
+    def save(self, path):
+        """ Save whole LCAIO object to directory, or zip archive
+
+        Blocks are stored as sparse .npz files, label tables and hybridization
+        table as Parquet files, and settings and io_categories as JSON. Block
+        labels identical to those of a label table (e.g., A_ff and PRO_f) are
+        only stored once.
+
+        Args
+        ----
+            path: directory to write to, or filename ending in '.zip' to
+                  write a single archive
+
+        """
+        if path.endswith('.zip'):
+            with tempfile.TemporaryDirectory() as directory:
+                self.save(directory)
+                with zipfile.ZipFile(path, 'w') as archive:
+                    for root, __, files in os.walk(directory):
+                        for f in files:
+                            archive.write(os.path.join(root, f),
+                                          os.path.relpath(os.path.join(root, f),
+                                                          directory))
+            return
+
+        metadata = {'format_version': 1,
+                    'settings': {'index_columns': self._arda_default_labels,
+                                 'ardaId_column': self._ardaId_column,
+                                 'sparse': self.sparse,
+                                 'solver': self.solver,
+                                 'solver_options': self.solver_options},
+                    'io_categories': _tag(self.io_categories)}
+        metadata.update(self.__save_parts(path,
+                                          self._LABEL_TABLES + ('hyb',),
+                                          self._BLOCKS))
+
+        with open(os.path.join(path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+    @classmethod
+    def load(cls, path, verbose=True):
+        """ Load LCAIO object saved with save()
+
+        Args
+        ----
+            path: directory or zip archive written by save()
+            verbose: whether to have logging on stream handler
+
+        Returns
+        -------
+            LCAIO object, with the settings (sparse mode, solver) it was
+            saved with
+        """
+        if zipfile.is_zipfile(path):
+            with tempfile.TemporaryDirectory() as directory:
+                with zipfile.ZipFile(path) as archive:
+                    archive.extractall(directory)
+                return cls.load(directory, verbose)
+
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        settings = metadata['settings']
+
+        lcaio = cls(index_columns=settings['index_columns'],
+                    verbose=verbose,
+                    sparse=settings['sparse'],
+                    solver=settings['solver'],
+                    solver_options=settings['solver_options'])
+        lcaio._ardaId_column = settings['ardaId_column']
+        lcaio.io_categories = _untag(metadata['io_categories'])
+        lcaio.__load_parts(path, metadata)
+
+        return lcaio
+
+    def save_shared_background(self, path):
+        """ Save background and IO as memory-mappable files, for many workers
+
+        Writes the background (A_bb, F_b, C) and IO (A_io, F_io, C_io) blocks
+        as the raw CSC arrays (data, indices, indptr) of their sparse matrices,
+        in uncompressed .npy files, along with their labels, final demands and
+        io_categories. Any number of processes can then attach to them with
+        attach_shared_background(), without each holding its own copy.
+
+        Args
+        ----
+            path: directory to write to
 
+        """
+        metadata = {'format_version': 1,
+                    'settings': {'index_columns': self._arda_default_labels},
+                    'io_categories': _tag(self.io_categories)}
+        metadata.update(self.__save_parts(path, self._SHARED_LABEL_TABLES,
+                                          self._SHARED_BLOCKS, mmap=True))
+
+        with open(os.path.join(path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+    @_instrumented('attach_shared_background', ('A_bb', 'A_io'))
+    def attach_shared_background(self, path, reset_foreground_io=True):
+        """ Attach to background and IO saved by save_shared_background()
+
+        The background and IO matrices are memory-mapped read-only, i.e.,
+        they are shared, zero-copy, by all processes attaching to the same
+        files, and only paged into memory as needed. The foreground (A_ff,
+        A_bf, F_f, A_io_f, F_io_f...) remains private to this object, and can
+        be modified and hybridized as usual. As with
+        extract_io_background_from_pymrio(), extract the foreground first.
+        Requires sparse mode.
+
+        Note that the whole-system A, F and C_all assembled by the
+        corresponding properties are private copies; with solver='block', the
+        whole-system A never gets assembled.
+
+        Args
+        ----
+            * path: directory written by save_shared_background()
+            * reset_foreground_io: whether to set foreground-IO interactions
+                                   (A_io_f, F_io_f) to zero; if False, keep
+                                   those of this object, e.g., hybridized
+
+        """
+        if not self.sparse:
+            raise ValueError("Shared background requires sparse mode "
+                             "(sparse=True)")
+
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        if metadata['settings']['index_columns'] != self._arda_default_labels:
+            raise ValueError("Shared background was saved with "
+                             "index_columns={}".format(
+                                 metadata['settings']['index_columns']))
+
+        self.io_categories = _untag(metadata['io_categories'])
+        self.__load_parts(path, metadata)
+
+        # Foreground-IO interactions, private
+        if len(self.A_io) and reset_foreground_io:
+            self.__reset_foreground_io()
+
+    def __reset_foreground_io(self):
+        """ Foreground-IO interactions, all zero until hybridization """
+        if self.sparse:
+            self.A_io_f = SparseFrame.zeros(self.A_io.index,
+                                            self.A_ff.columns)
+            self.F_io_f = SparseFrame.zeros(self.F_io.index,
+                                            self.A_ff.columns)
         else:
-            sio.savemat(filename, {
-                    'A_gen':      csc(self.A.values),
-                    'F_gen':      csc(self.F.values),
-                    'C':          csc(self.C_all.values),
-                    'y_gen':      csc(self.y.values),
-                    'PRO_gen':    self.PRO.values,
-                    'STR':        self.STR_all.values,
-                    'IMP':        self.IMP_all.values,
-                    'PRO_header': np.atleast_2d(self.PRO.columns.values),
-                    'STR_header': np.atleast_2d(self.STR_all.columns.values),
-                    'IMP_header': np.atleast_2d(self.IMP_all.columns.values)
-                    })
+            self.A_io_f = pd.DataFrame(0.0, index=self.A_io.index,
+                                       columns=self.A_ff.columns)
+
+            self.F_io_f = pd.DataFrame(0.0, index=self.F_io.index,
+                                       columns=self.A_ff.columns)
+
+    def __save_parts(self, path, tables, blocks, mmap=False):
+        """ Write label tables and blocks to directory, see save()
 
+        With mmap=True, blocks other than final demands get written as raw,
+        uncompressed CSC arrays that can be memory-mapped.
+
+        Returns
+        -------
+            Description of all saved parts, needed by __load_parts()
+        """
+
+        for subdirectory in ('labels', 'blocks'):
+            os.makedirs(os.path.join(path, subdirectory), exist_ok=True)
+        metadata = {'labels': {}, 'blocks': {}}
+
+        for name in tables:
+            table = getattr(self, name)
+            if not len(table.index) and not len(table.columns):
+                continue  # never defined
+            metadata['labels'][name] = write_table(
+                    table, os.path.join(path, 'labels', name + '.parquet'))
+
+        for name in blocks:
+            block = getattr(self, name)
+            if not len(block.index) and not len(block.columns):
+                continue  # never defined
+            filename = os.path.join(path, 'blocks', name)
+            metadata['blocks'][name] = {'mmap': mmap and
+                                        name not in self._DEMAND_BLOCKS}
+            if metadata['blocks'][name]['mmap']:
+                matrix = to_csc(block).copy()
+                matrix.sum_duplicates()  # canonical, never modified in place
+                for array in ('data', 'indices', 'indptr'):
+                    np.save(filename + '.' + array + '.npy',
+                            getattr(matrix, array))
+            else:
+                scipy.sparse.save_npz(filename + '.npz', to_csc(block))
+
+            for axis in ('index', 'columns'):
+                labels = getattr(block, axis)
+                for table in tables:
+                    if table in metadata['labels'] and \
+                            getattr(self, table).index.equals(labels):
+                        metadata['blocks'][name][axis] = table
+                        break
+                else:
+                    metadata['blocks'][name][axis] = write_table(
+                            pd.DataFrame(index=labels),
+                            filename + '.' + axis + '.parquet')
+
+        return metadata
+
+    def __load_parts(self, path, metadata):
+        """ Read label tables and blocks written by __save_parts() """
+
+        for name, meta in metadata['labels'].items():
+            setattr(self, name, read_table(
+                    os.path.join(path, 'labels', name + '.parquet'), meta))
+
+        for name, meta in metadata['blocks'].items():
+            filename = os.path.join(path, 'blocks', name)
+            labels = []
+            for axis in ('index', 'columns'):
+                if isinstance(meta[axis], dict):
+                    labels.append(read_table(filename + '.' + axis + '.parquet',
+                                             meta[axis]).index)
+                else:
+                    labels.append(getattr(self, meta[axis]).index)
+
+            if meta['mmap']:
+                data, indices, indptr = [
+                        np.load(filename + '.' + array + '.npy', mmap_mode='r')
+                        for array in ('data', 'indices', 'indptr')]
+                matrix = scipy.sparse.csc_matrix(
+                        (data, indices, indptr),
+                        shape=(len(labels[0]), len(labels[1])), copy=False)
+            else:
+                matrix = scipy.sparse.load_npz(filename + '.npz')
+
+            if name in self._DEMAND_BLOCKS:
+                block = pd.DataFrame(matrix.toarray(), *labels)
+            else:
+                block = self.__make_block(matrix, *labels)
+            setattr(self, name, block)
 
 # -------------------------MANIPULATE LCA INVENTORIES--------------------------
 #
@@ -610,17 +1244,17 @@ class LCAIO(object):
         """
 
         # Reorder rows in F_f to match indexes of F_b
-        F_f_new = self.F_f.reindex_axis(self.F_b.index, axis=0).fillna(0.0)
+        F_f_new, conserved = reindex_conserved(self.F_f, self.F_b.index, 0)
 
-        if F_f_new.sum().sum() != self.F_f.sum().sum():
+        if not conserved:
             raise ValueError('Some of the emissions are not conserved during'
                              ' the re-indexing! Will not re-index F_f')
         else:
             self.F_f = F_f_new
 
         # Reorder rows in A_bf to match row order in A_bb
-        A_bf_new = self.A_bf.reindex_axis(self.A_bb.index, axis=0).fillna(0.0)
-        if A_bf_new.sum().sum() != self.A_bf.sum().sum():
+        A_bf_new, conserved = reindex_conserved(self.A_bf, self.A_bb.index, 0)
+        if not conserved:
             raise ValueError('Some of the product-flows are not conserved'
                     ' during the re-indexing! Will not re-index A_bf')
         else:
@@ -732,8 +1366,12 @@ class LCAIO(object):
             self.A_bf.columns += shift
             self.F_f.columns += shift
 
+        # labels were modified in place
+        self._invalidate('PRO_f', 'A_ff', 'A_bf', 'F_f', 'y_f')
+
 # ------------------------HYBRIDIZATION---------------------------------------
 #
+    @_instrumented('hybridize_process')
     def hybridize_process(self,
                           process_index,
                           io_index,
@@ -771,7 +1409,7 @@ class LCAIO(object):
 
         # Check whether there are already signs of hybrization, i.e., non-null
         # entries in self.A_io_f matrix
-        if np.any(self.A_io_f.ix[:, process_index].values != 0):
+        if np.any(get_column(self.A_io_f, process_index) != 0):
             if not overwrite:
                 if verbose:
                     msg = ("Non-zero entries in A_io_f for process {}. It seems"
@@ -783,48 +1421,287 @@ class LCAIO(object):
                     msg = ("Non-zero entries in A_io_f for sector {}. About to"
                            " overwrite them. These will be lost.")
                     self.log.warning(msg.format(process_index))
-        try:
-            all_sectors = self.A_io_f.index.get_level_values(sector_level_name)
-        except KeyError:
-            try:
-                all_sectors = self.A_io_f.index.get_level_values(None)
-            except KeyError:
-                all_sectors = self.A_io_f.index.get_level_values(sector_level_name)
-                print(sector_level_name + 'is different from the sector_level_name entered in A_io_f')
+        sectors = self.sector_index(sector_level_name)
 
+        # technology is about to change in place
+        self._invalidate('A_io_f')
 
         # input structures of sector to hybridize
-        self.A_io_f.ix[:, process_index] = self.A_io.ix[:, io_index] * price
+        inputs = get_column(self.A_io, io_index) * price
 
         # get name of sector of interest
-        bo = (self.A_io.index.to_series() == io_index).values
-        sector = all_sectors[bo].tolist()[0]
+        sector = sectors['labels'][self.A_io.index.get_loc(io_index)]
 
 
         if doublecounted_intrasector:
         # Remove all inputs from sector to which process belongs
-            bo = all_sectors.isin([sector])
-            self.A_io_f.ix[bo, process_index] *= (1.0 - doublecounted_intrasector)
+            bo = sectors['positions'][sector]
+            inputs[bo] *= (1.0 - doublecounted_intrasector)
 
         # Remove all inputs from categories of the economy
         for cat in doublecounted_categories:
-            bo = all_sectors.isin(self.io_categories[cat])
-            self.A_io_f.ix[bo, process_index] = 0.0
+            bo = self.category_mask(cat, sector_level_name)
+            inputs[bo] = 0.0
 
         # Remove all inputs from specific sectors
         for i in doublecounted_sectors:
-            self.A_io_f.ix[i, process_index] = 0.0
+            inputs[self.A_io_f.index.get_loc(i)] = 0.0
+
+        set_column(self.A_io_f, process_index, inputs)
+
+        # record the price applied, in place of any other for the process
+        others = [i != process_index for i in self.hyb['process_index']]
+        self.hyb = pd.concat(
+                [self.hyb[others],
+                 pd.DataFrame([(process_index, io_index, price)],
+                              columns=['process_index', 'io_index',
+                                       'price_per_fu'])],
+                ignore_index=True)
+
+    @_instrumented('build_doublecounting_filter', ('doublecounting',))
+    def build_doublecounting_filter(self,
+                                    doublecounted_intrasector=1,
+                                    doublecounted_categories=tuple(),
+                                    sector_level_name='sector'):
+        """ Sector-level filter of double counting, for hybridize_all()
+
+        Sparse matrix of the share of each input sector (rows) to remove from
+        the EEIO complement of a process matched to a given sector (columns):
+        doublecounted_intrasector on the diagonal, and whole rows of ones for
+        the sectors of doublecounted_categories. Being defined on sector names
+        only, regardless of regions, it can be saved and reused with other
+        versions of the IO background sharing the same sector classification.
+
+        Args
+        ----
+            Same as hybridize_process()
+
+        Returns
+        -------
+            The filter, also stored as self.doublecounting
+        """
+
+        positions = self.sector_index(sector_level_name)['positions']
+        sectors = pd.Index(list(positions.keys()), name=sector_level_name)
+
+        removed = np.zeros(len(sectors), dtype=bool)
+        for cat in doublecounted_categories:
+            removed |= sectors.isin(self.io_categories[cat])
+
+        # whole rows for removed sectors, diagonal for the others
+        rows = [np.repeat(np.flatnonzero(removed), len(sectors))]
+        cols = [np.tile(np.arange(len(sectors)), removed.sum())]
+        data = [np.ones(removed.sum() * len(sectors))]
+        if doublecounted_intrasector:
+            kept = np.flatnonzero(~removed)
+            rows.append(kept)
+            cols.append(kept)
+            data.append(np.full(len(kept), float(doublecounted_intrasector)))
+        matrix = scipy.sparse.csc_matrix(
+                (np.concatenate(data), (np.concatenate(rows),
+                                        np.concatenate(cols))),
+                shape=(len(sectors), len(sectors)))
+
+        self.doublecounting = self.__make_block(matrix, sectors, sectors)
+        return self.doublecounting
+
+    @_instrumented('hybridize_all', ('A_io_f',))
+    def hybridize_all(self,
+                      doublecounted_intrasector=1,
+                      doublecounted_categories=tuple(),
+                      doublecounted_sectors=tuple(),
+                      sector_level_name='sector',
+                      overwrite=False,
+                      verbose=True,
+                      doublecounting=None):
+        """ Hybridize all processes listed in self.hyb, in one vectorized pass
+
+        Gives the same A_io_f as calling hybridize_process() for each row of
+        self.hyb, but in a few sparse matrix operations: the columns of A_io
+        of all matched sectors, scaled by a price vector, are multiplied
+        element-wise by the complement of the double-counting filter of
+        build_doublecounting_filter().
+
+        Args
+        ----
+            Same as hybridize_process(). The processes, EEIO sectors and
+            prices are read from the columns 'process_index', 'io_index' and
+            'price_per_fu' of self.hyb: the first row of each process, or the
+            last one with overwrite, in which case the other rows of the
+            process are dropped from self.hyb
+
+            * doublecounting: sector-level filter to use, e.g., as saved with
+                              another IO version, instead of building one from
+                              doublecounted_intrasector and
+                              doublecounted_categories [default None]
+        """
+
+        hyb = _hybridized_rows(self.hyb, overwrite)
+        if overwrite:
+            # rows applied are then also the first of each process
+            self.hyb = hyb
+        if len(hyb) == 0:
+            self.log.info("No process to hybridize in self.hyb")
+            return
+
+        process_pos = self.A_io_f.columns.get_indexer(
+                hyb['process_index'].tolist())
+        io_pos = self.A_io.index.get_indexer(hyb['io_index'].tolist())
+        if np.any(process_pos < 0) or np.any(io_pos < 0):
+            raise ValueError("Some processes or sectors of self.hyb are not"
+                             " found in A_io_f or A_io")
+        prices = hyb['price_per_fu'].values.astype(float)
+
+        # Check whether there are already signs of hybrization
+        A_io_f = to_csc(self.A_io_f)
+        done = np.asarray((A_io_f != 0).sum(axis=0)).ravel()[process_pos] > 0
+        if np.any(done):
+            done_processes = hyb['process_index'].values[done].tolist()
+            if not overwrite:
+                if verbose:
+                    msg = ("Non-zero entries in A_io_f for processes {}. They"
+                           " seem already hybridized. Skipping them.")
+                    self.log.warning(msg.format(done_processes))
+                process_pos = process_pos[~done]
+                io_pos = io_pos[~done]
+                prices = prices[~done]
+            elif verbose:
+                msg = ("Non-zero entries in A_io_f for processes {}. About to"
+                       " overwrite them. These will be lost.")
+                self.log.warning(msg.format(done_processes))
+
+        if doublecounting is None:
+            doublecounting = self.build_doublecounting_filter(
+                    doublecounted_intrasector, doublecounted_categories,
+                    sector_level_name)
+
+        # sector of each row of A_io, as positions in the filter
+        sectors = self.sector_index(sector_level_name)
+        uniques = list(sectors['positions'].keys())
+        filter_rows = doublecounting.index.get_indexer(uniques)
+        filter_cols = doublecounting.columns.get_indexer(uniques)
+        if np.any(filter_rows < 0) or np.any(filter_cols < 0):
+            missing = [u for u, i, j in zip(uniques, filter_rows, filter_cols)
+                       if i < 0 or j < 0]
+            raise ValueError("Sectors {} not found in double-counting "
+                             "filter".format(missing))
+        filter_rows = filter_rows[sectors['codes']]
+        filter_cols = filter_cols[sectors['codes']]
+
+        # input structures of sectors to hybridize, scaled by prices
+        inputs = to_csc(self.A_io)[:, io_pos].dot(
+                scipy.sparse.diags(prices))
+        inputs = scipy.sparse.coo_matrix(inputs)
+
+        # filter out double counting, element-wise on non-zero inputs only
+        if inputs.nnz:
+            removed = to_csc(doublecounting).tocsr()[
+                    filter_rows[inputs.row], filter_cols[io_pos][inputs.col]]
+            inputs.data *= 1.0 - np.asarray(removed).ravel()
+
+        # Remove all inputs from specific sectors
+        specific = np.zeros(inputs.shape[0], dtype=bool)
+        for i in doublecounted_sectors:
+            specific[self.A_io_f.index.get_loc(i)] = True
+        inputs.data[specific[inputs.row]] = 0.0
+        inputs.eliminate_zeros()
+
+        # write all hybridized columns at once
+        self._invalidate('A_io_f')
+        n_f = A_io_f.shape[1]
+        place = scipy.sparse.csr_matrix(
+                (np.ones(len(process_pos)), (np.arange(len(process_pos)),
+                                             process_pos)),
+                shape=(len(process_pos), n_f))
+        keep = np.ones(n_f)
+        keep[process_pos] = 0.0
+        new = (A_io_f.dot(scipy.sparse.diags(keep))
+               + scipy.sparse.csc_matrix(inputs).dot(place))
+
+        if isinstance(self.A_io_f, SparseFrame):
+            self.A_io_f.matrix = scipy.sparse.csc_matrix(new)
+        else:
+            self.A_io_f.iloc[:, process_pos] = new[:, process_pos].toarray()
+
+    def sector_index(self, sector_level_name='sector'):
+        """ Index of the sector of each row of A_io (and A_io_f), cached
+
+        Built once per IO background, and reused by all hybridizations to
+        locate intrasector and double-counted flows.
+
+        Args
+        ----
+            * sector_level_name: Name of level in multiindex that holds the
+                                 sector names [Default: 'sector']
+        Returns
+        -------
+            dictionary with:
+            * 'labels': sector name of each row, as numpy array
+            * 'codes': integer code of the sector of each row
+            * 'positions': dictionary of the row positions of each sector
+        """
+        cache = self._cache.setdefault('sector_index', {})
+        try:
+            return cache[sector_level_name]
+        except KeyError:
+            pass
+
+        try:
+            all_sectors = self.A_io.index.get_level_values(sector_level_name)
+        except KeyError:
+            try:
+                all_sectors = self.A_io.index.get_level_values(None)
+            except KeyError:
+                raise KeyError("No level {} in the index of A_io, nor any "
+                               "unnamed level; check sector_level_name".format(
+                                   sector_level_name))
+
+        labels = np.asarray(all_sectors)
+        codes, uniques = pd.factorize(labels)
+        order = np.argsort(codes, kind='mergesort')
+        bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+        positions = dict(zip(uniques, np.split(order, bounds)))
+
+        index = cache[sector_level_name] = {'labels': labels,
+                                            'codes': codes,
+                                            'positions': positions}
+        return index
+
+    def category_mask(self, category, sector_level_name='sector'):
+        """ Boolean mask of the rows of A_io belonging to a category of
+        self.io_categories, cached until the category is redefined """
+
+        members = tuple(self.io_categories[category])
+        key = (sector_level_name, category, members)
+        cache = self._cache.setdefault('category_masks', {})
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        positions = self.sector_index(sector_level_name)['positions']
+        mask = np.zeros(len(self.A_io.index), dtype=bool)
+        for sector in members:
+            if sector in positions:
+                mask[positions[sector]] = True
+        cache[key] = mask
+        return mask
 
 # ----------------------LIFECYCLE CALCULATIONS -------------------------------
 #
+    @_instrumented('calc_lifecycle')
     def calc_lifecycle(self, stage='impacts', perspective=None):
         """ Simply calculates lifecycle production, emissions, or impacts
         
+        The sparse LU factorization of (I - A) is computed on the first call
+        and reused for all later calls, until the technology matrix changes.
+
         Args
         ----
             * stage:    either 'production', 'emissions', or 'impacts'
                         determines what is being calculated
-            * perspective:  
+            * perspective:  if 'consumer', keep the lifecycle production of
+                            each final demand in a separate column
 
         Returns
         -------
@@ -833,18 +1710,29 @@ class LCAIO(object):
 
         """
 
-        I = pd.DataFrame(np.eye(len(self.A)),
-                         index=self.A.index,
-                         columns=self.A.columns)
+        index = self.PRO.index
+        y = np.asarray(self.y.values, dtype=float)
 
         if perspective == 'consumer':
-            y = pd.DataFrame(np.diag(self.y.squeeze()))
-            x = pd.DataFrame(np.linalg.solve(I-self.A, y),
-                             index = self.A.index,
-                             columns = self.A.index)
+            # only the columns of diag(y) with a non-zero demand need solving
+            y = y[:, 0]
+            nz = np.flatnonzero(y)
+            rhs = np.zeros((len(y), len(nz)))
+            rhs[nz, np.arange(len(nz))] = y[nz]
+            x_nz = self._solve(rhs)
+            if self.sparse:
+                place = scipy.sparse.csr_matrix(
+                        (np.ones(len(nz)), (np.arange(len(nz)), nz)),
+                        shape=(len(nz), len(y)))
+                x = SparseFrame(scipy.sparse.csc_matrix(x_nz).dot(place),
+                                index=index,
+                                columns=index)
+            else:
+                x = np.zeros((len(y), len(y)))
+                x[:, nz] = x_nz
+                x = pd.DataFrame(x, index=index, columns=index)
         else:
-            x = pd.DataFrame(np.linalg.solve(I-self.A, self.y),
-                             index = self.A.index)
+            x = pd.DataFrame(self._solve(y), index=index)
 
         if stage == 'production':
             return x
@@ -857,14 +1745,2115 @@ class LCAIO(object):
         if stage == 'impacts':
             return d
 
+    @_instrumented('calc_lifecycle_batch')
+    def calc_lifecycle_batch(self, demands, stage='impacts', chunk_size=500):
+        """ Calculates lifecycle production, emissions, or impacts of many
+        final demands in one pass
+
+        All demands are solved against the same (cached) factorization of
+        (I - A), as multiple right-hand side columns.
+
+        Args
+        ----
+            * demands:  final demands, keyed by process labels (any subset of
+                        PRO.index), either as:
+                            - a DataFrame, with one demand per column
+                            - a dict of demand vectors (Series or dicts)
+                            - an iterable of demand vectors
+            * stage:    either 'production', 'emissions', or 'impacts'
+                        determines what is being calculated
+            * chunk_size: number of demands solved simultaneously, which
+                          bounds the memory needed for intermediate results
+                          [default 500]
+
+        Returns
+        -------
+            * DataFrame of lifecycle production (x), emissions (e) or impacts
+              (d), with one column per demand
+
+        """
+
+        Y = demand_frame(demands)
+        index = self.PRO.index
+        pos = index.get_indexer(Y.index)
+        if np.any(pos < 0):
+            raise ValueError("Unknown process labels in demands: {}".format(
+                             Y.index[pos < 0].tolist()))
+
+        if stage == 'production':
+            labels = index
+        elif stage == 'emissions':
+            labels = self.F.index
+            F = to_matrix(self.F)
+        elif stage == 'impacts':
+            labels = self.C_all.index
+            F = to_matrix(self.F)
+            C = to_matrix(self.C_all)
+        else:
+            raise ValueError("Unknown stage {}".format(stage))
+
+        values = np.asarray(Y.values, dtype=float)
+        results = []
+        for start in range(0, Y.shape[1], chunk_size):
+            chunk = values[:, start:start + chunk_size]
+            rhs = np.zeros((len(index), chunk.shape[1]))
+            rhs[pos, :] = chunk
+            result = self._solve(rhs)
+            if stage != 'production':
+                result = F.dot(result)
+            if stage == 'impacts':
+                result = C.dot(result)
+            results.append(result)
+
+        if len(results):
+            results = np.hstack(results)
+        else:
+            results = np.zeros((len(labels), 0))
+        return pd.DataFrame(results, index=labels, columns=Y.columns)
+
+    @_instrumented('contribution_analysis')
+    def contribution_analysis(self, by='process', demand=None,
+                              relative=False, sector_level_name='sector'):
+        """ Contributions to the lifecycle impacts of a final demand
+
+        Args
+        ----
+            * by:   what to break the impacts down by
+                - 'process':  direct impacts of each process (or IO sector)
+                - 'stressor': impacts of each stressor, over whole lifecycle
+                - 'sector':   direct impacts of IO processes, summed by IO
+                              sector (over regions)
+                - 'block':    direct impacts of foreground, background and IO
+            * demand:   final demand (Series or dict keyed by process labels)
+                        [default: y, summed over its columns]
+            * relative: if True, express contributions as shares of total
+                        impacts [default False]
+            * sector_level_name: Name of level in multiindex that holds the
+                                 sector names, for by='sector'
+                                 [Default: 'sector']
+
+        Returns
+        -------
+            * DataFrame of contributions, with one column per impact category
+        """
+        A, F, C = self._system_matrices()
+        x = self._solve(self._demand_vector(demand))
+        impacts = self.C_all.index
+
+        if by == 'stressor':
+            e = F.dot(x)
+            contributions = C.dot(scipy.sparse.diags(e)).T.toarray()
+            labels = self.F.index
+        else:
+            contributions = C.dot(F).dot(scipy.sparse.diags(x)).T.toarray()
+            labels = self.PRO.index
+            nf = len(self.PRO_f)
+            nb = len(self.PRO_b)
+            if by == 'block':
+                contributions = np.vstack([
+                        contributions[:nf].sum(axis=0),
+                        contributions[nf:nf + nb].sum(axis=0),
+                        contributions[nf + nb:].sum(axis=0)])
+                labels = pd.Index(['foreground', 'background', 'io'])
+            elif by == 'sector':
+                sectors = self.sector_index(sector_level_name)['labels']
+                rows = self.A_io.index.get_indexer(self.PRO_io.index)
+                contributions = pd.DataFrame(
+                        contributions[nf + nb:],
+                        columns=impacts).groupby(sectors[rows]).sum()
+                labels = contributions.index.rename(sector_level_name)
+                contributions = contributions.values
+            elif by != 'process':
+                raise ValueError("Unknown contribution type {}".format(by))
+
+        contributions = pd.DataFrame(contributions, index=labels,
+                                     columns=impacts)
+        if relative:
+            contributions = contributions / contributions.sum(axis=0)
+        return contributions
+
+    @_instrumented('structural_path_analysis')
+    def structural_path_analysis(self, impact, demand=None, cutoff=0.001,
+                                 max_depth=8, max_paths=1000):
+        """ Most important supply chain paths contributing to an impact
+
+        Paths are explored from the final demand upstream, most important
+        first, with a priority queue. Each path is ranked by its total
+        impact, i.e., the amount of its most upstream process times that
+        process's lifecycle impact multiplier; paths (and all their upstream
+        extensions) below the cutoff are pruned. Multipliers come from one
+        transposed solve of (I - A), so the Leontief inverse is never built.
+
+        Args
+        ----
+            * impact:   label of impact category (in C_all.index)
+            * demand:   final demand (Series or dict keyed by process labels)
+                        [default: y, summed over its columns]
+            * cutoff:   minimum total impact of a path to explore it, as a
+                        share of the lifecycle impact [default 0.001]
+            * max_depth: maximum number of upstream steps [default 8]
+            * max_paths: maximum number of paths returned [default 1000]
+
+        Returns
+        -------
+            * DataFrame of paths, most important first, with columns:
+                - 'path': tuple of process labels, from final demand upstream
+                - 'depth': number of upstream steps
+                - 'amount': production of most upstream process, for path
+                - 'direct': direct impact of that production
+                - 'total': lifecycle impact of that production
+                - 'share': direct impact, as a share of lifecycle impact
+        """
+        position = self.C_all.index.get_indexer([impact])[0]
+        if position < 0:
+            raise ValueError("Unknown impact category {}".format(impact))
+
+        A, F, C = self._system_matrices()
+        intensity = np.asarray(C[position, :].dot(F).todense()).ravel()
+        multiplier = self._solve_transposed(intensity)
+        y = self._demand_vector(demand)
+        total = y.dot(multiplier)
+        threshold = abs(cutoff * total)
+
+        # max-heap of paths on total impact; counter settles ties
+        heap = []
+        counter = 0
+        for j in np.flatnonzero(y):
+            if abs(y[j] * multiplier[j]) >= threshold:
+                heapq.heappush(heap, (-abs(y[j] * multiplier[j]), counter,
+                                      (j,), y[j]))
+                counter += 1
+
+        labels = self.PRO.index
+        paths = []
+        while heap and len(paths) < max_paths:
+            __, __, path, amount = heapq.heappop(heap)
+            j = path[-1]
+            paths.append((tuple(labels[i] for i in path), len(path) - 1,
+                          amount, amount * intensity[j],
+                          amount * multiplier[j]))
+            if len(path) > max_depth:
+                continue
+            for k in range(A.indptr[j], A.indptr[j + 1]):
+                i = A.indices[k]
+                upstream = amount * A.data[k]
+                if abs(upstream * multiplier[i]) >= threshold:
+                    heapq.heappush(heap, (-abs(upstream * multiplier[i]),
+                                          counter, path + (i,), upstream))
+                    counter += 1
+
+        paths = pd.DataFrame(paths, columns=['path', 'depth', 'amount',
+                                             'direct', 'total'])
+        paths['share'] = paths['direct'] / total
+        return paths
+
+    def _system_matrices(self):
+        """ A, F and C_all of whole system as CSC matrices, for calculations
+
+        Undefined (NaN) characterisation factors count as zeros.
+        """
+        C = to_csc(self.C_all).copy()
+        C.data = np.nan_to_num(C.data)
+        C.eliminate_zeros()
+        return to_csc(self.A), to_csc(self.F), C
+
+    def _demand_vector(self, demand=None):
+        """ Final demand as vector over PRO.index
+
+        Args
+        ----
+            * demand: Series or dict keyed by process labels
+                      [default: y, summed over its columns]
+        """
+        index = self.PRO.index
+        if demand is None:
+            return np.asarray(self.y.values, dtype=float).sum(axis=1)
+
+        Y = demand_frame([demand])
+        pos = index.get_indexer(Y.index)
+        if np.any(pos < 0):
+            raise ValueError("Unknown process labels in demand: {}".format(
+                             Y.index[pos < 0].tolist()))
+        y = np.zeros(len(index))
+        y[pos] = Y.values[:, 0]
+        return y
+
+    def run_scenarios(self, scenarios, stage='impacts', max_workers=None,
+                      chunksize=1):
+        """ Calculate lifecycle results of many scenarios, in parallel
+
+        Each scenario is evaluated on a light copy of this object, which
+        shares all unchanged matrices (and their cached factorizations) with
+        it, and only holds its own version of what the scenario changes. This
+        object is left untouched, except for keeping factorizations of
+        unchanged blocks.
+
+        Scenarios get distributed over a pool of worker processes. In sparse
+        mode, the background and IO get saved once with
+        save_shared_background(), and every worker attaches to them, i.e.,
+        only the foreground is sent to workers, and the background matrices
+        are memory-mapped and shared by all of them. Factorizations cannot be
+        shared across processes: each worker factorizes what it needs once,
+        and reuses it for all its scenarios. In dense mode, each worker
+        receives (and holds) its own copy of this object.
+
+        Args
+        ----
+            * scenarios: list of scenario definitions, i.e., dictionaries
+                         with any of the following keys:
+                - 'name':        label of scenario in results
+                                 [default: position in list]
+                - 'foreground':  datasource of alternative foreground, as for
+                                 extract_foreground()
+                - 'hybridize':   list of dictionaries of arguments to
+                                 hybridize_process() (process_index, io_index,
+                                 price, doublecounted_intrasector...)
+                - 'demand':      final demand (Series or dict keyed by
+                                 process labels) to calculate instead of y
+            * stage:    either 'production', 'emissions', or 'impacts'
+            * max_workers: number of worker processes; if 1, scenarios are run
+                           serially in this process [default: number of CPUs]
+            * chunksize: number of scenarios sent to a worker at a time
+
+        Returns
+        -------
+            * tidy DataFrame of results, with columns 'scenario', 'label'
+              (process, stressor or impact), 'demand' (column of final
+              demand) and 'value'
+        """
+        scenarios = [dict(scenario, name=scenario.get('name', i))
+                     for i, scenario in enumerate(scenarios)]
+
+        if max_workers == 1:
+            results = [self._run_scenario(scenario, stage)
+                       for scenario in scenarios]
+        elif self.sparse:
+            with tempfile.TemporaryDirectory() as directory:
+                self.save_shared_background(directory)
+                results = self.__map_scenarios(
+                        scenarios, stage, max_workers, chunksize,
+                        (self.__scenario_copy(shared=False), directory))
+        else:
+            results = self.__map_scenarios(scenarios, stage, max_workers,
+                                           chunksize, (self, None))
+
+        tables = []
+        for name, result in results:
+            n, k = result.shape
+            tables.append(pd.DataFrame(
+                    {'scenario': [name] * (n * k),
+                     'label': list(result.index) * k,
+                     'demand': np.repeat(np.asarray(result.columns,
+                                                    dtype=object), n),
+                     'value': np.asarray(result.values, dtype=float
+                                         ).T.ravel()},
+                    columns=['scenario', 'label', 'demand', 'value']))
+        if not len(tables):
+            return pd.DataFrame(columns=['scenario', 'label', 'demand',
+                                         'value'])
+        return pd.concat(tables, ignore_index=True)
+
+    def _run_scenario(self, scenario, stage='impacts'):
+        """ Lifecycle results of one scenario, see run_scenarios() """
+        lcaio = self.__scenario_copy()
+
+        if 'foreground' in scenario:
+            lcaio.extract_foreground(scenario['foreground'])
+            if len(lcaio.A_io):
+                lcaio.__reset_foreground_io()
+
+        if scenario.get('hybridize'):
+            # only private copy of the hybridized block
+            lcaio.A_io_f = lcaio.A_io_f.copy()
+            for kwargs in scenario['hybridize']:
+                lcaio.hybridize_process(**kwargs)
+
+        if 'demand' in scenario:
+            result = lcaio.calc_lifecycle_batch({0: scenario['demand']},
+                                                stage)
+        else:
+            result = lcaio.calc_lifecycle(stage)
+
+        # hand back cached items still valid for this object, e.g.,
+        # factorizations of unchanged background blocks; items with untracked
+        # dependencies (e.g., lu_base) may stem from the scenario's changes
+        for key, value in lcaio._cache.items():
+            if key not in self._cache and \
+                    key in self._CACHE_DEPENDENCIES and all(
+                        lcaio.__dict__.get(i) is self.__dict__.get(i)
+                        for i in self._CACHE_DEPENDENCIES[key]):
+                self._cache[key] = value
+
+        return scenario['name'], result
+
+    def __scenario_copy(self, shared=True):
+        """ Copy sharing all matrices and cached items with this object
+
+        Attributes reassigned in the copy do not affect this object, but
+        matrices modified in place do: copy them first. Metrics of the copy
+        are its own.
+
+        Args
+        ----
+            shared: if False, leave out the blocks and labels saved by
+                    save_shared_background(), and cached items, e.g., to send
+                    the copy to workers attaching to the shared background
+        """
+        lcaio = object.__new__(type(self))
+        lcaio.__dict__.update(self.__dict__)
+        lcaio.__dict__['_cache'] = dict(self._cache) if shared else {}
+        lcaio.__dict__['solver_info'] = {}
+        lcaio.__dict__['metrics'] = []
+        lcaio.__dict__['_stages'] = []
+        if not shared:
+            for name in self._SHARED_LABEL_TABLES + self._SHARED_BLOCKS:
+                lcaio.__dict__[name] = pd.DataFrame()
+        return lcaio
+
+    @staticmethod
+    def __map_scenarios(scenarios, stage, max_workers, chunksize, initargs):
+        """ Run scenarios on a pool of workers, see _init_scenario_worker()
+        """
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers, initializer=_init_scenario_worker,
+                initargs=initargs) as executor:
+            return list(executor.map(
+                    _run_scenario_in_worker,
+                    [(scenario, stage) for scenario in scenarios],
+                    chunksize=chunksize))
+
+    def _solve(self, rhs):
+        """ Solve (I - A) x = rhs, for one or many right-hand side columns """
+        rhs = np.asarray(rhs, dtype=float)
+        with self._stage('solve') as record:
+            if self.solver == 'lu' and self.solver_options.get('prune'):
+                x = self.__pruned_solve(rhs)
+            elif self.solver == 'lu':
+                x = self.__factorization().solve(rhs)
+            elif self.solver == 'block':
+                x = self._solve_blocks(rhs)
+            elif self.solver in ('neumann', 'gmres', 'bicgstab'):
+                x = self._solve_iterative(rhs)
+                if record is not None:
+                    record['solver_info'] = dict(self.solver_info)
+            else:
+                raise ValueError("Unknown solver {}".format(self.solver))
+        return x
+
+    def __pruned_solve(self, rhs):
+        """ Solve (I - A) x = rhs over the processes that rhs reaches only
+
+        All processes that cannot be reached from the non-zero rows of rhs,
+        through the supply chains of A, have zero production; the reduced
+        system of the others gets factorized (and cached for the same set of
+        reachable processes), solved, and scattered back to the full system.
+        """
+        A = to_csc(self.A)
+        seeds = np.flatnonzero(np.any(rhs.reshape(len(rhs), -1) != 0,
+                                      axis=1))
+        with self._stage('pruning') as record:
+            keep = reachable(A, seeds)
+        if record is not None:
+            record['sizes'] = {'reachable': int(keep.sum()),
+                               'processes': len(keep)}
+
+        if keep.all():
+            return self.__factorization().solve(rhs)
+        x = np.zeros_like(rhs)
+        if not keep.any():
+            return x
+
+        key = np.packbits(keep).tobytes()
+        cached = self._cache.get('lu_pruned')
+        if cached is None or cached[0] != key:
+            positions = np.flatnonzero(keep)
+            with self._stage('factorization pruned') as record:
+                reduced = A[positions][:, positions]
+                lu = factorize(reduced)
+                if record is not None:
+                    record['sizes'] = {'lu': factorization_size(reduced, lu)}
+            cached = self._cache['lu_pruned'] = (key, positions, lu)
+        __, positions, lu = cached
+        x[positions] = lu.solve(rhs[positions])
+        return x
+
+    def _solve_iterative(self, rhs):
+        """ Solve (I - A) x = rhs iteratively, without factorizing (I - A)
+
+        Solvers (self.solver):
+            - 'neumann': power series x = sum_k A^k rhs, truncated once the
+                         last term is below tolerance. Needs all eigenvalues
+                         of A within the unit circle, as for any productive
+                         economy.
+            - 'gmres', 'bicgstab': Krylov solvers from scipy, preconditioned
+                         with an incomplete LU ('ilu') or the diagonal
+                         ('jacobi') of (I - A), as per self.solver_options
+
+        Iterations, relative residuals (per right-hand side column) and
+        timing get stored in self.solver_info.
+        """
+        tol = self.solver_options['tol']
+        maxiter = self.solver_options['maxiter']
+        start = time.perf_counter()
+        I_A = self.__iteration_matrix()
+
+        squeeze = rhs.ndim == 1
+        rhs = rhs.reshape(rhs.shape[0], -1)
+        rhs_norm = norms(rhs)
+        rhs_norm[rhs_norm == 0] = 1.0
+        x = np.zeros_like(rhs)
+        iterations = []
+
+        if self.solver == 'neumann':
+            # after adding the k-th term, the residual is the (k+1)-th term
+            A = scipy.sparse.identity(I_A.shape[0], format='csr') - I_A
+            x[:] = rhs
+            term = A.dot(rhs)
+            k = 0
+            while k < maxiter and np.any(norms(term) > tol * rhs_norm):
+                x += term
+                term = A.dot(term)
+                k += 1
+            iterations = [k] * rhs.shape[1]
+        else:
+            preconditioner = self.__preconditioner()
+            for j in range(rhs.shape[1]):
+                x[:, j], n = krylov_solve(self.solver, I_A, rhs[:, j], tol,
+                                          maxiter, preconditioner)
+                iterations.append(n)
+
+        residual = norms(rhs - I_A.dot(x)) / rhs_norm
+        self.solver_info = {'solver': self.solver,
+                            'iterations': iterations,
+                            'residual': residual.tolist(),
+                            'time': time.perf_counter() - start}
+
+        if np.any(residual > tol):
+            self.log.warning("Iterative solver {} did not converge within {}"
+                             " iterations (max relative residual {:g})".format(
+                                 self.solver, maxiter, residual.max()))
+        else:
+            self.log.info("Iterative solver {} converged in {} iterations,"
+                          " {:.3f} s".format(self.solver, max(iterations),
+                                             self.solver_info['time']))
+        if squeeze:
+            return x[:, 0]
+        return x
+
+    def __iteration_matrix(self):
+        """ (I - A) as a CSR matrix, cached """
+        try:
+            return self._cache['I_A']
+        except KeyError:
+            A = to_csc(self.A)
+            I_A = scipy.sparse.identity(A.shape[0], format='csr') - A
+            I_A = self._cache['I_A'] = scipy.sparse.csr_matrix(I_A)
+            return I_A
+
+    def __preconditioner(self):
+        """ Preconditioner of (I - A) for Krylov solvers, cached """
+        kind = self.solver_options['preconditioner']
+        cached = self._cache.get('preconditioner')
+        if cached is not None and cached[0] == kind:
+            return cached[1]
+
+        I_A = self.__iteration_matrix()
+        if kind is None:
+            M = None
+        elif kind == 'ilu':
+            ilu = scipy.sparse.linalg.spilu(I_A.tocsc())
+            M = scipy.sparse.linalg.LinearOperator(I_A.shape, ilu.solve)
+        elif kind == 'jacobi':
+            diagonal = I_A.diagonal()
+            diagonal[diagonal == 0] = 1.0
+            M = scipy.sparse.linalg.LinearOperator(I_A.shape,
+                                                   lambda v: v / diagonal)
+        else:
+            raise ValueError("Unknown preconditioner {}".format(kind))
+        self._cache['preconditioner'] = (kind, M)
+        return M
+
+    def _solve_blocks(self, rhs):
+        """ Solve (I - A) x = rhs block by block
+
+        No background process or IO sector ever requires a foreground process,
+        and background and IO do not require each other, so (I - A) is block
+        lower-triangular:
+
+            x_f  = (I - A_ff)^-1 y_f
+            x_b  = (I - A_bb)^-1 (y_b  + A_bf x_f)
+            x_io = (I - A_io)^-1 (y_io + A_io_f x_f)
+
+        Each diagonal block has its own cached factorization, such that
+        foreground modifications never trigger the re-factorization of the
+        (much bigger) A_bb and A_io.
+        """
+        nf = len(self.PRO_f)
+        nb = len(self.PRO_b)
+
+        x = np.empty_like(rhs)
+        x[:nf] = self.__block_solve('lu_ff', self.A_ff, self.PRO_f, rhs[:nf])
+        x_f = x[:nf]
+
+        coupling = self.__cached_block('A_bf_block', self.A_bf, self.PRO_b,
+                                       self.PRO_f)
+        x[nf:nf + nb] = self.__block_solve('lu_bb', self.A_bb, self.PRO_b,
+                                           rhs[nf:nf + nb] + coupling.dot(x_f))
+
+        coupling = self.__cached_block('A_io_f_block', self.A_io_f,
+                                       self.PRO_io, self.PRO_f)
+        x[nf + nb:] = self.__block_solve('lu_io', self.A_io, self.PRO_io,
+                                         rhs[nf + nb:] + coupling.dot(x_f))
+        return x
+
+    def __cached_block(self, key, block, rows, cols):
+        """ CSC matrix of block, conformed to order of row and column labels
+        """
+        try:
+            return self._cache[key]
+        except KeyError:
+            matrix = assemble_blocks([block], rows.index, cols.index).matrix
+            self._cache[key] = matrix
+            return matrix
+
+    def __block_solve(self, key, block, labels, rhs, trans='N'):
+        """ Solve (I - block) x = rhs with cached factorization of block
+
+        With trans='T', solve the transposed system (I - block)^T x = rhs
+        """
+        if len(labels) == 0:
+            return rhs
+        try:
+            lu = self._cache[key]
+        except KeyError:
+            with self._stage('factorization ' + key) as record:
+                matrix = assemble_blocks([block], labels.index, labels.index)
+                lu = self._cache[key] = factorize(matrix.matrix)
+                if record is not None:
+                    record['sizes'] = {key: factorization_size(matrix.matrix,
+                                                               lu)}
+        return lu.solve(rhs, trans=trans)
+
+    @_instrumented('solve transposed')
+    def _solve_transposed(self, rhs):
+        """ Solve (I - A)^T x = rhs, e.g., for the multipliers of all processes
+
+        Reuses the cached factorizations. With the block solver, (I - A)^T is
+        block upper-triangular, and gets solved background and IO first;
+        other solvers all use the factorization of the 'lu' solver.
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        if self.solver != 'block':
+            return self.__factorization().solve(rhs, trans='T')
+
+        nf = len(self.PRO_f)
+        nb = len(self.PRO_b)
+
+        x = np.empty_like(rhs)
+        x[nf:nf + nb] = self.__block_solve('lu_bb', self.A_bb, self.PRO_b,
+                                           rhs[nf:nf + nb], 'T')
+        x[nf + nb:] = self.__block_solve('lu_io', self.A_io, self.PRO_io,
+                                         rhs[nf + nb:], 'T')
+
+        A_bf = self.__cached_block('A_bf_block', self.A_bf, self.PRO_b,
+                                   self.PRO_f)
+        A_io_f = self.__cached_block('A_io_f_block', self.A_io_f,
+                                     self.PRO_io, self.PRO_f)
+        x[:nf] = self.__block_solve('lu_ff', self.A_ff, self.PRO_f,
+                                    rhs[:nf] + A_bf.T.dot(x[nf:nf + nb])
+                                    + A_io_f.T.dot(x[nf + nb:]), 'T')
+        return x
+
+    def __factorization(self):
+        """ Sparse LU factorization of (I - A), cached on the object
+
+        The cached factorization gets discarded whenever a technology block
+        (A_*) or process label (PRO_*) changes, see _CACHE_DEPENDENCIES. In
+        incremental mode, the last full factorization is kept aside
+        ('lu_base') and, as long as few columns of A changed since, gets
+        reused through a LowRankUpdate instead of re-factorizing.
+        """
+        try:
+            return self._cache['lu']
+        except KeyError:
+            pass
+
+        A = to_csc(self.A)
+        with self._stage('factorization') as record:
+            if self.solver_options.get('incremental'):
+                base = self._cache.get('lu_base')
+                if base is not None and base['index'].equals(self.PRO.index):
+                    update = low_rank_update(base['lu'], base['A'], A,
+                                             self.solver_options['max_rank'])
+                    if update is not None:
+                        self.solver_info = {'solver': 'lu',
+                                            'update_rank': update.rank}
+                        if record is not None:
+                            record['solver_info'] = dict(self.solver_info)
+                        self._cache['lu'] = update
+                        return update
+
+            lu = self._cache['lu'] = factorize(A)
+            if record is not None:
+                record['sizes'] = {'lu': factorization_size(A, lu)}
+            if self.solver_options.get('incremental'):
+                self._cache['lu_base'] = {'lu': lu, 'A': A,
+                                          'index': self.PRO.index}
+                self.solver_info = {'solver': 'lu', 'update_rank': 0}
+        return lu
+
+# -----------------------LABELLED SPARSE MATRICES-----------------------------
+#
+class SparseFrame(object):
+    """ A scipy.sparse matrix with row and column labels
+
+    Light-weight stand-in for a DataFrame, used to store LCAIO matrices in
+    sparse mode. Only the operations needed by LCAIO are implemented, and none
+    of them densify the matrix unless explicitly asked (toarray, to_frame).
+
+    Attributes
+    ----------
+        matrix  : the scipy.sparse matrix, in CSC format
+        index   : row labels (Pandas Index or MultiIndex)
+        columns : column labels (Pandas Index or MultiIndex)
+    """
+
+    def __init__(self, matrix, index, columns):
+        self.matrix = scipy.sparse.csc_matrix(matrix, dtype=float)
+        self.index = index if isinstance(index, pd.Index) else pd.Index(index)
+        if isinstance(columns, pd.Index):
+            self.columns = columns
+        else:
+            self.columns = pd.Index(columns)
+        if self.matrix.shape != (len(self.index), len(self.columns)):
+            raise ValueError("Shape of matrix {} does not match that of labels"
+                             " {}".format(self.matrix.shape,
+                                          (len(self.index),
+                                           len(self.columns))))
+
+    @classmethod
+    def zeros(cls, index, columns):
+        """ Empty (all-zero) sparse matrix with given labels """
+        return cls(scipy.sparse.csc_matrix((len(index), len(columns))),
+                   index, columns)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """ Sparse copy of a DataFrame """
+        return cls(frame.values.astype(float), frame.index, frame.columns)
+
+    def __repr__(self):
+        return "<SparseFrame {}x{}, {} stored entries>".format(
+                self.shape[0], self.shape[1], self.nnz)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def nnz(self):
+        return self.matrix.nnz
+
+    def copy(self):
+        return SparseFrame(self.matrix.copy(), self.index.copy(),
+                           self.columns.copy())
+
+    def toarray(self):
+        """ Dense numpy array (use with care on big matrices) """
+        return self.matrix.toarray()
+
+    def to_frame(self):
+        """ Dense DataFrame (use with care on big matrices) """
+        return pd.DataFrame(self.toarray(), index=self.index,
+                            columns=self.columns)
+
+    def sum(self):
+        """ Sum of all entries """
+        return self.matrix.sum()
+
+    def reindex(self, index=None, columns=None):
+        """ Conform to new labels, with zeros for labels that were absent
+
+        Rows (or columns) are moved by positional gather, in O(nnz) operations
+        """
+        matrix = self.matrix
+        if index is not None:
+            matrix = _selection_matrix(self.index, index).dot(matrix)
+        else:
+            index = self.index
+        if columns is not None:
+            matrix = matrix.dot(_selection_matrix(self.columns, columns).T)
+        else:
+            columns = self.columns
+        return SparseFrame(matrix, index, columns)
+
+    def drop(self, labels, axis=0):
+        """ Remove rows (axis=0) or columns (axis=1) with given labels """
+        # let pandas resolve labels, as it would for a DataFrame
+        if axis in (0, 'index'):
+            keep = _positions(self.index).drop(labels).values
+            return SparseFrame(self.matrix.tocsr()[keep, :], self.index[keep],
+                               self.columns)
+        keep = _positions(self.columns).drop(labels).values
+        return SparseFrame(self.matrix[:, keep], self.index,
+                           self.columns[keep])
+
+    def dot(self, other):
+        """ Matrix product with a DataFrame or SparseFrame, aligned on labels
+
+        Returns a DataFrame if other is a DataFrame, a SparseFrame otherwise
+        """
+        if not self.columns.equals(other.index):
+            if len(self.columns.intersection(other.index)) < len(self.columns):
+                raise ValueError('matrices are not aligned')
+            other = other.reindex(index=self.columns)
+
+        if isinstance(other, SparseFrame):
+            return SparseFrame(self.matrix.dot(other.matrix), self.index,
+                               other.columns)
+        return pd.DataFrame(self.matrix.dot(other.values), index=self.index,
+                            columns=other.columns)
+
+    def get_column(self, label):
+        """ Dense 1D array of the values in column with given label """
+        j = self.columns.get_loc(label)
+        return self.matrix[:, j].toarray().ravel()
+
+    def set_column(self, label, values):
+        """ Overwrite column with given label with (dense) values """
+        j = self.columns.get_loc(label)
+        new_col = scipy.sparse.csc_matrix(np.asarray(values,
+                                                     dtype=float).reshape(-1,
+                                                                          1))
+        self.matrix = scipy.sparse.hstack([self.matrix[:, :j],
+                                           new_col,
+                                           self.matrix[:, j + 1:]],
+                                          format='csc')
+
+
+def _positions(labels):
+    """ Series of integer positions, indexed by labels """
+    return pd.Series(np.arange(len(labels)), index=labels)
+
+
+def _selection_matrix(old_labels, new_labels):
+    """ Sparse 0/1 matrix P such that P.dot(M) conforms M's rows to new_labels
+
+    Labels of new_labels not found in old_labels result in rows of zeros
+    """
+    pos = old_labels.get_indexer(new_labels)
+    found = np.flatnonzero(pos >= 0)
+    return scipy.sparse.csr_matrix((np.ones(len(found)), (found, pos[found])),
+                                   shape=(len(new_labels), len(old_labels)))
+
+
+class LabelRegistry(object):
+    """ Stable integer positions of labels, in groups of consecutive rows
+
+    Each group of labels (e.g., PRO_f, PRO_b and PRO_io for the processes of
+    the whole system) occupies a contiguous range of positions, starting at
+    an offset given by the sizes of the groups before it. Blocks labelled by
+    a group are then placed in the whole system by offset arithmetic, in
+    O(nnz) operations, instead of looking up each of their labels; lookups
+    by label remain available on top (get_indexer(), locate()).
+
+    Args
+    ----
+        groups: list of (name, Index) pairs, in order of positions
+    """
+
+    def __init__(self, groups):
+        self.names = [name for name, __ in groups]
+        self.indexes = dict(groups)
+        self.offsets = {}
+        offset = 0
+        for name, index in groups:
+            self.offsets[name] = offset
+            offset += len(index)
+        self.size = offset
+        self._index = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def index(self):
+        """ Concatenated labels of all groups, built on first use """
+        if self._index is None:
+            indexes = [self.indexes[name] for name in self.names]
+            self._index = indexes[0].append(indexes[1:])
+        return self._index
+
+    def slice(self, name):
+        """ Positions of a whole group, as a slice """
+        start = self.offsets[name]
+        return slice(start, start + len(self.indexes[name]))
+
+    def locate(self, name, labels):
+        """ Positions of labels of a group, -1 for labels not in group
+
+        Free of any lookup when labels are those of the group, as is.
+        """
+        group = self.indexes[name]
+        if labels is group or labels.equals(group):
+            positions = np.arange(len(group))
+        else:
+            positions = group.get_indexer(labels)
+        return np.where(positions >= 0, positions + self.offsets[name], -1)
+
+    def get_indexer(self, labels):
+        """ Positions of any labels, -1 for labels absent from all groups """
+        return self.index.get_indexer(labels)
+
+    def assemble(self, blocks, columns=None):
+        """ Stitch blocks in one CSC matrix, by offsets
+
+        Args
+        ----
+            blocks:  list of (block, row group, column group) triplets, with
+                     blocks as DataFrames, SparseFrames or None; rows and
+                     columns with labels absent from their group are left out
+            columns: registry of column groups [default: same as rows]
+
+        Returns
+        -------
+            scipy.sparse CSC matrix, of len(self) x len(columns)
+        """
+        if columns is None:
+            columns = self
+        rows, cols, data = [], [], []
+        for block, row_group, column_group in blocks:
+            if block is None or block.shape[0] == 0 or block.shape[1] == 0:
+                continue
+            coo = to_csc(block).tocoo()
+            row_pos = self.locate(row_group, block.index)[coo.row]
+            col_pos = columns.locate(column_group, block.columns)[coo.col]
+            keep = (row_pos >= 0) & (col_pos >= 0) & (coo.data != 0)
+            rows.append(row_pos[keep])
+            cols.append(col_pos[keep])
+            data.append(coo.data[keep])
+
+        if len(data):
+            rows, cols, data = (np.concatenate(i) for i in (rows, cols, data))
+        return scipy.sparse.csc_matrix((data, (rows, cols)),
+                                       shape=(len(self), len(columns)))
+
+
+def _hybridized_rows(hyb, overwrite=False):
+    """ Row of the hybridization table applied to each process, as by
+    LCAIO.hybridize_all(): the first one, or the last one with overwrite """
+    return hyb.drop_duplicates('process_index',
+                               keep='last' if overwrite else 'first')
+
+
+def assemble_blocks(blocks, index, columns):
+    """ Assemble labelled blocks in one big SparseFrame without densifying
+
+    Each block (DataFrame or SparseFrame) is positioned in the final matrix
+    according to its labels, and any row or column with a label absent from
+    index or columns is left out. Absent or empty blocks are skipped. Same as
+    LabelRegistry.assemble(), with a single group of rows and of columns.
+
+    Args
+    ----
+        blocks:  (nested) list of DataFrames and/or SparseFrames
+        index:   row labels of final matrix
+        columns: column labels of final matrix
+    """
+    rows = LabelRegistry([('index', index)])
+    matrix = rows.assemble([(block, 'index', 'columns')
+                            for block in _flatten(blocks)],
+                           LabelRegistry([('columns', columns)]))
+    return SparseFrame(matrix, index, columns)
+
+
+def write_matfile(filename, variables, do_compression=False):
+    """ Write variables to Matlab mat-file, one at a time
+
+    Args
+    ----
+        filename
+        variables: iterable of (name, value) pairs, e.g., a generator that
+                   only assembles each value when it is its turn to be written
+        do_compression: whether to compress the mat-file
+    """
+    with open(filename, 'wb') as f:
+        for name, value in variables:
+            # the file header is only written on first call, at position 0
+            sio.savemat(f, {name: value}, do_compression=do_compression)
+
+
+def _flatten(nested):
+    for i in nested:
+        if isinstance(i, (list, tuple)):
+            for j in _flatten(i):
+                yield j
+        else:
+            yield i
+
+
+def to_csc(block):
+    """ scipy.sparse CSC matrix from DataFrame or SparseFrame """
+    if isinstance(block, SparseFrame):
+        return block.matrix
+    return scipy.sparse.csc_matrix(np.asarray(block.values, dtype=float))
+
+
+def reindex_conserved(block, labels, axis=0):
+    """ Reindex rows or columns, and check that no flow got lost doing so
+
+    Returns
+    -------
+        * the reindexed DataFrame or SparseFrame
+        * whether all non-zero entries were conserved in the operation
+    """
+    if isinstance(block, SparseFrame):
+        if axis == 0:
+            new = block.reindex(index=labels)
+            lost = to_csc(block).tocsr()[~block.index.isin(labels), :]
+        else:
+            new = block.reindex(columns=labels)
+            lost = to_csc(block)[:, ~block.columns.isin(labels)]
+        return new, lost.count_nonzero() == 0
+
+    # move rows (or columns) by their positions, as for sparse blocks
+    values = np.asarray(block.values, dtype=float)
+    if axis == 1:
+        values = values.T
+    old = block.index if axis == 0 else block.columns
+    positions = LabelRegistry([('labels', labels)]).locate('labels', old)
+    found = positions >= 0
+    moved = np.zeros((len(labels), values.shape[1]))
+    moved[positions[found]] = values[found]
+    conserved = not np.any(values[~found] != 0)
+
+    if axis == 0:
+        new = pd.DataFrame(moved, index=labels, columns=block.columns)
+    else:
+        new = pd.DataFrame(moved.T, index=block.index, columns=labels)
+    return new, conserved
+
+
+def factorize(A):
+    """ Sparse LU factorization (SuperLU) of (I - A) """
+    I_A = scipy.sparse.identity(A.shape[0], format='csc') - A
+    return scipy.sparse.linalg.splu(scipy.sparse.csc_matrix(I_A))
+
+
+def low_rank_update(lu, A0, A, max_rank):
+    """ Update factorization of (I - A0) to (I - A), if few columns changed
+
+    Args
+    ----
+        lu: SuperLU factorization of (I - A0)
+        A0: technology matrix that got factorized, CSC
+        A: new technology matrix of same dimensions, CSC
+        max_rank: maximum number of changed columns
+
+    Returns
+    -------
+        * a LowRankUpdate, or None if more than max_rank columns changed
+    """
+    if A0.shape != A.shape:
+        return None
+    D = scipy.sparse.csc_matrix(A - A0)
+    D.eliminate_zeros()
+    columns = np.flatnonzero(np.diff(D.indptr))
+    if len(columns) > max_rank:
+        return None
+    return LowRankUpdate(lu, D[:, columns], columns)
+
+
+class LowRankUpdate(object):
+    """ Solves with (I - A) from the factorization of (I - A0)
+
+    With A - A0 non-zero in only k columns, (I - A) = (I - A0) - U V^T, where
+    U holds these k columns and V the matching k columns of the identity.
+    Solves then follow the Sherman-Morrison-Woodbury formula, at the cost of
+    k solves with the old factorization (once) and a dense k x k system.
+
+    Args
+    ----
+        lu: SuperLU factorization of (I - A0)
+        U: changed columns of A - A0 (n x k), scipy.sparse
+        columns: positions of these columns in A
+    """
+
+    def __init__(self, lu, U, columns):
+        self.lu = lu
+        self.U = scipy.sparse.csc_matrix(U)
+        self.columns = np.asarray(columns)
+        self.rank = len(self.columns)
+        self.shape = lu.shape
+        self._updates = {}
+
+    def __update(self, trans):
+        """ Correction terms for solves with (I - A) or its transpose """
+        try:
+            return self._updates[trans]
+        except KeyError:
+            pass
+        k = self.rank
+        if trans == 'N':
+            # Z = (I - A0)^-1 U;  capacitance I - V^T Z
+            Z = self.lu.solve(self.U.toarray())
+            capacitance = np.eye(k) - Z[self.columns]
+        else:
+            # Z = (I - A0)^-T V;  capacitance I - U^T Z
+            V = np.zeros((self.shape[0], k))
+            V[self.columns, np.arange(k)] = 1.0
+            Z = self.lu.solve(V, trans='T')
+            capacitance = np.eye(k) - self.U.T.dot(Z)
+        update = self._updates[trans] = (Z,
+                                         scipy.linalg.lu_factor(capacitance))
+        return update
+
+    def solve(self, rhs, trans='N'):
+        """ Same interface as SuperLU.solve() """
+        x = self.lu.solve(rhs, trans=trans)
+        if not self.rank:
+            return x
+        Z, capacitance = self.__update(trans)
+        if trans == 'N':
+            projected = x[self.columns]
+        else:
+            projected = self.U.T.dot(x)
+        return x + Z.dot(scipy.linalg.lu_solve(capacitance, projected))
+
+
+def reachable(A, seeds):
+    """ Processes reachable from seed processes through supply chains
+
+    Breadth-first traversal of the graph with an edge from each process to
+    each of its inputs (from j to i wherever A[i, j] is non-zero), starting
+    from all seeds at once.
+
+    Args
+    ----
+        A: technology matrix, scipy.sparse
+        seeds: positions of the processes to start from, e.g., with a
+               non-zero final demand
+
+    Returns
+    -------
+        boolean mask of reachable processes, seeds included
+    """
+    n = A.shape[0]
+    seeds = np.asarray(seeds, dtype=int)
+    if not len(seeds):
+        return np.zeros(n, dtype=bool)
+
+    # inputs of each process, plus a virtual source (n) pointing to seeds
+    inputs = scipy.sparse.csr_matrix(A.T)
+    inputs.eliminate_zeros()
+    source = scipy.sparse.csr_matrix(
+            (np.ones(len(seeds)), (np.zeros(len(seeds), dtype=int), seeds)),
+            shape=(1, n + 1))
+    graph = scipy.sparse.vstack(
+            [scipy.sparse.hstack([inputs, scipy.sparse.csr_matrix((n, 1))]),
+             source], format='csr')
+    order = scipy.sparse.csgraph.breadth_first_order(
+            graph, n, directed=True, return_predecessors=False)
+
+    mask = np.zeros(n + 1, dtype=bool)
+    mask[order] = True
+    return mask[:n]
+
+
+def factorization_size(A, lu):
+    """ Size of LU factors of (I - A), and their fill-in, for metrics
+
+    Returns
+    -------
+        dictionary with shape and nnz of (I - A), nnz of its L and U factors,
+        and fill-in, the ratio of the two
+    """
+    nnz = A.nnz - np.count_nonzero(A.diagonal()) + A.shape[0]
+    return {'shape': [int(i) for i in A.shape],
+            'nnz': int(nnz),
+            'nnz_factors': int(lu.nnz),
+            'fill_in': lu.nnz / nnz if nnz else 0.0}
+
+
+def krylov_solve(method, M, b, tol, maxiter, preconditioner=None):
+    """ Solve M x = b with scipy's gmres or bicgstab
+
+    Returns
+    -------
+        * solution x
+        * number of iterations
+    """
+    count = [0]
+
+    def callback(*args):
+        count[0] += 1
+
+    solve = getattr(scipy.sparse.linalg, method)
+    kwargs = {'maxiter': maxiter, 'M': preconditioner, 'callback': callback}
+    if method == 'gmres':
+        kwargs['callback_type'] = 'pr_norm'
+    # scipy < 1.12 names relative tolerance "tol"
+    if 'rtol' in inspect.signature(solve).parameters:
+        kwargs['rtol'] = tol
+    else:
+        kwargs['tol'] = tol
+    x, info = solve(M, b, atol=0.0, **kwargs)
+    if info < 0:
+        raise ValueError("Illegal input or breakdown in {}".format(method))
+    return x, count[0]
+
+
+def norms(a):
+    """ Euclidean norms of the columns of a 2D array """
+    return np.sqrt((a ** 2).sum(axis=0))
+
+
+def to_matrix(block):
+    """ Numerical content of DataFrame or SparseFrame, without copying sparse
+    matrices """
+    if isinstance(block, SparseFrame):
+        return block.matrix
+    return np.asarray(block.values, dtype=float)
+
+
+def demand_frame(demands):
+    """ Combine final demand vectors in a DataFrame, one demand per column
+
+    Args
+    ----
+        demands: DataFrame, Series, dict of demand vectors, or iterable of
+                 demand vectors. Each demand vector is a Series or a dict keyed
+                 by process labels.
+    """
+    if isinstance(demands, pd.DataFrame):
+        Y = demands
+    elif isinstance(demands, pd.Series):
+        Y = demands.to_frame()
+    elif isinstance(demands, dict):
+        Y = pd.DataFrame({k: pd.Series(v) for k, v in demands.items()})
+    else:
+        Y = pd.DataFrame({k: pd.Series(v) for k, v in enumerate(demands)})
+    return Y.fillna(0.0)
+
+
+def get_column(block, label):
+    """ Values of a column of a DataFrame or SparseFrame, as a 1D array """
+    if isinstance(block, SparseFrame):
+        return block.get_column(label)
+    return np.asarray(block.loc[:, label].values, dtype=float)
+
+
+def set_column(block, label, values):
+    """ Overwrite in place a column of a DataFrame or SparseFrame """
+    if isinstance(block, SparseFrame):
+        block.set_column(label, values)
+    else:
+        block.loc[:, label] = values
+
+# -----------------------UNCERTAINTY PROPAGATION------------------------------
+#
+class MonteCarlo(object):
+    """ Monte Carlo propagation of uncertainty in foreground coefficients
+
+    Uncertain entries can be attached to the foreground columns of the system
+    (A_ff, A_bf, A_io_f, F_f), as well as to hybridization prices, which scale
+    whole columns of A_io_f. Since only foreground columns vary, each batch
+    of iterations only requires small foreground solves (batched), plus one
+    multiple right-hand side solve against the factorization of the
+    background and IO, which is computed once and reused for all iterations.
+    Results are accumulated as streaming statistics (StreamingStatistics), so
+    memory use does not grow with the number of iterations.
+
+    e.g.
+        In: mc = MonteCarlo(lcaio)
+        In: mc.add_uncertainty('A_ff', (u'Batt Packing', 10002),
+                               (u's+orm', 10005), 'lognormal', sigma=0.1)
+        In: mc.add_price_uncertainty((u's+orm', 10005), 'uniform',
+                                     low=1.5, high=2.5)
+        In: mc.run(10000)
+
+    Attributes
+    ----------
+        labels      : labels of calculated results (PRO, STR_all or IMP_all)
+        entries     : uncertain coefficients (one dictionary each)
+        prices      : uncertain hybridization prices (one dictionary each)
+    """
+
+    # Parameters of each distribution, and those defaulting to the
+    # deterministic value of the coefficient
+    _DISTRIBUTIONS = {'lognormal': (('sigma',), 'median'),
+                      'normal': (('sd',), 'mean'),
+                      'uniform': (('low', 'high'), None),
+                      'triangular': (('low', 'high'), 'mode')}
+
+    # Up to this many foreground processes, foreground systems of a batch get
+    # solved as one stack of dense matrices; above, as low-rank updates of
+    # one sparse factorization
+    _DENSE_FOREGROUND = 300
+
+    def __init__(self, lcaio, stage='impacts', demand=None):
+        """ Define Monte Carlo analysis of LCAIO object
+
+        Args
+        ----
+            * lcaio:    LCAIO object, whose coefficients are used as
+                        deterministic values
+            * stage:    either 'production', 'emissions', or 'impacts'
+            * demand:   final demand (Series or dict keyed by process labels)
+                        [default: lcaio.y, summed over its columns]
+        """
+        if stage not in ('production', 'emissions', 'impacts'):
+            raise ValueError("Unknown stage {}".format(stage))
+        self.stage = stage
+
+        index = lcaio.PRO.index
+        self._index = index
+        self._stressors = lcaio.F.index
+        self._blocks = {'A_ff': lcaio.PRO_f.index,
+                        'A_bf': lcaio.PRO_b.index,
+                        'A_io_f': lcaio.PRO_io.index,
+                        'F_f': lcaio.STR.index}
+        self._nf = len(lcaio.PRO_f)
+
+        self._A, self._F, self._C = lcaio._system_matrices()
+        self._hyb = lcaio.hyb
+        self._y = lcaio._demand_vector(demand)
+
+        if stage == 'production':
+            self.labels = index
+        elif stage == 'emissions':
+            self.labels = self._stressors
+        else:
+            self.labels = lcaio.C_all.index
+
+        self.entries = []
+        self.prices = []
+        self._plan = None
+        self._lu = None
+        self._lu_ff = None
+
+    def __getstate__(self):
+        # factorizations cannot be pickled, get recomputed by each worker
+        state = self.__dict__.copy()
+        state['_lu'] = None
+        state['_lu_ff'] = None
+        return state
+
+    def add_uncertainty(self, block, row, column, distribution, **params):
+        """ Attach a probability distribution to a foreground coefficient
+
+        Args
+        ----
+            * block:        'A_ff', 'A_bf', 'A_io_f' or 'F_f'
+            * row, column:  labels of the coefficient in the block
+            * distribution: one of
+                - 'lognormal', with parameter sigma (standard deviation of
+                  the underlying normal) and optional median
+                - 'normal', with parameter sd and optional mean
+                - 'uniform', with parameters low and high
+                - 'triangular', with parameters low and high, and optional
+                  mode
+                Optional parameters default to the deterministic value.
+        """
+        if block not in self._blocks:
+            raise ValueError("Uncertainty only supported in blocks {}".format(
+                             sorted(self._blocks)))
+        if row not in self._blocks[block]:
+            raise ValueError("{} not a row of {}".format(row, block))
+
+        col = self.__position(self._index, column)
+        if col >= self._nf:
+            raise ValueError("{} not a foreground process".format(column))
+        if block == 'F_f':
+            matrix, pos = 'F', self.__position(self._stressors, row)
+        else:
+            matrix, pos = 'A', self.__position(self._index, row)
+
+        value = getattr(self, '_' + matrix)[pos, col]
+        self.entries = [i for i in self.entries
+                        if (i['matrix'], i['row'], i['col']) !=
+                           (matrix, pos, col)]
+        self.entries.append(dict(matrix=matrix, row=pos, col=col, value=value,
+                                 **self.__check(distribution, value, params)))
+        self._plan = None
+
+    def add_price_uncertainty(self, process, distribution, **params):
+        """ Attach a probability distribution to a hybridization price
+
+        The sampled price scales the whole column of A_io_f of the
+        process, relative to the price applied to it, as recorded in the
+        hybridization table (hyb) by hybridize_process() or hybridize_all().
+
+        Args
+        ----
+            * process:      label of hybridized foreground process
+            * distribution: as for add_uncertainty(), with parameters
+                            expressed as prices
+        """
+        hyb = _hybridized_rows(self._hyb)
+        hyb = hyb[[i == process for i in hyb['process_index']]]
+        if not len(hyb):
+            raise ValueError("{} not in hybridization table (hyb)".format(
+                             process))
+        price = float(hyb['price_per_fu'].iloc[0])
+        col = self.__position(self._index, process)
+
+        self.prices = [i for i in self.prices if i['col'] != col]
+        self.prices.append(dict(col=col, value=price,
+                                **self.__check(distribution, price, params)))
+        self._plan = None
+
+    def __position(self, index, label):
+        pos = index.get_indexer([label])[0]
+        if pos < 0:
+            raise ValueError("Unknown label {}".format(label))
+        return pos
+
+    def __check(self, distribution, value, params):
+        """ Validated parameters of distribution, with defaults filled in """
+        try:
+            required, central = self._DISTRIBUTIONS[distribution]
+        except KeyError:
+            raise ValueError("Unknown distribution {}".format(distribution))
+        missing = [i for i in required if i not in params]
+        if missing:
+            raise ValueError("Missing parameters {} of {} distribution".format(
+                             missing, distribution))
+        params = dict(params)
+        if central is not None:
+            params.setdefault(central, value)
+        return {'distribution': distribution, 'params': params}
+
+    def run(self, iterations, batch_size=100, seed=None, max_workers=1,
+            percentiles=(2.5, 50, 97.5), reservoir_size=1000):
+        """ Run Monte Carlo iterations, and summarize their results
+
+        Args
+        ----
+            * iterations:   number of iterations
+            * batch_size:   number of iterations sampled and solved at once
+            * seed:         seed of random number generator, for reproducible
+                            results
+            * max_workers:  number of processes sharing the iterations
+                            [default 1, run in this process]
+            * percentiles:  percentiles to estimate
+            * reservoir_size: number of iterations kept to estimate
+                            percentiles, see StreamingStatistics
+
+        Returns
+        -------
+            * DataFrame with, for each result label, the mean, standard
+              deviation, minimum, maximum and percentiles over all iterations
+        """
+        seeds = np.random.SeedSequence(seed).spawn(max(max_workers, 1))
+        shares = [len(i) for i in np.array_split(np.arange(iterations),
+                                                 len(seeds))]
+        args = [(self, n, batch_size, s, reservoir_size)
+                for n, s in zip(shares, seeds)]
+
+        if max_workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers) as pool:
+                results = list(pool.map(_monte_carlo_worker, args))
+        else:
+            results = [_monte_carlo_worker(i) for i in args]
+
+        statistics = results[0]
+        for i in results[1:]:
+            statistics.merge(i)
+        return statistics.summary(self.labels, percentiles)
+
+    def _run_batches(self, iterations, batch_size, seed, reservoir_size):
+        """ Run iterations batch by batch, see run() """
+        rng = np.random.default_rng(seed)
+        statistics = StreamingStatistics(len(self.labels), reservoir_size,
+                                         rng)
+        for start in range(0, iterations, batch_size):
+            batch = min(batch_size, iterations - start)
+            statistics.update(self.calculate(self.sample(batch, rng)))
+        return statistics
+
+    def sample(self, batch, rng):
+        """ Draw sampled values of all uncertain entries
+
+        Returns
+        -------
+            * dictionary of 'A' and 'F' tuples of (rows, columns, deviations
+              of sampled values from deterministic values), with deviations
+              of shape (number of entries, batch)
+        """
+        plan = self.__plan()
+        values = np.empty((len(plan['values']), batch))
+        values[plan['fixed']] = plan['values'][plan['fixed']].reshape(-1, 1)
+        for distribution, (group, params) in plan['groups'].items():
+            values[group] = _draw(rng, distribution, params, batch)
+
+        for price, scaled in zip(self.prices, plan['scaled']):
+            factor = _draw(rng, price['distribution'], [price['params']],
+                           batch)[0] / price['value']
+            values[scaled] *= factor
+
+        values -= plan['values'].reshape(-1, 1)
+        return {matrix: (rows, cols, values[group])
+                for matrix, (group, rows, cols) in plan['matrices'].items()}
+
+    def __plan(self):
+        """ Uncertain entries, arranged for vectorized sampling """
+        if self._plan is not None:
+            return self._plan
+
+        entries = list(self.entries)
+        known = set((i['matrix'], i['row'], i['col']) for i in entries)
+
+        # price uncertainty scales all IO inputs of a process
+        io = self._A[self._nf:, :].tocsc()
+        scaled = []
+        for price in self.prices:
+            col = price['col']
+            rows = io.indices[io.indptr[col]:io.indptr[col + 1]] + self._nf
+            for row in rows:
+                if ('A', row, col) not in known:
+                    known.add(('A', row, col))
+                    entries.append({'matrix': 'A', 'row': row, 'col': col,
+                                    'distribution': None,
+                                    'value': self._A[row, col]})
+            scaled.append([i for i, entry in enumerate(entries)
+                           if entry['matrix'] == 'A' and entry['col'] == col
+                           and entry['row'] >= self._nf])
+
+        groups = {}
+        for distribution in self._DISTRIBUTIONS:
+            group = [i for i, entry in enumerate(entries)
+                     if entry['distribution'] == distribution]
+            if group:
+                groups[distribution] = (group, [entries[i]['params']
+                                                for i in group])
+        matrices = {}
+        for matrix in ('A', 'F'):
+            group = [i for i, entry in enumerate(entries)
+                     if entry['matrix'] == matrix]
+            matrices[matrix] = (
+                    group,
+                    np.array([entries[i]['row'] for i in group], dtype=int),
+                    np.array([entries[i]['col'] for i in group], dtype=int))
+
+        self._plan = {'values': np.array([i['value'] for i in entries],
+                                         dtype=float),
+                      'fixed': [i for i, entry in enumerate(entries)
+                                if entry['distribution'] is None],
+                      'groups': groups,
+                      'scaled': scaled,
+                      'matrices': matrices}
+        return self._plan
+
+    def calculate(self, samples):
+        """ Lifecycle results of a batch of sampled coefficients
+
+        Args
+        ----
+            * samples: as returned by sample(), i.e., deviations of sampled
+                       coefficients from their deterministic values
+
+        Returns
+        -------
+            * array of results, of shape (number of labels, batch)
+        """
+        nf = self._nf
+        rows, cols, delta = samples['A']
+        batch = delta.shape[1]
+        ff = rows < nf
+
+        # foreground, one (small) system per iteration
+        if nf <= self._DENSE_FOREGROUND:
+            M = np.tile(np.eye(nf) - self._A[:nf, :nf].toarray(),
+                        (batch, 1, 1))
+            M[:, rows[ff], cols[ff]] -= delta[ff].T
+            rhs = np.tile(self._y[:nf].reshape(1, nf, 1), (batch, 1, 1))
+            x_f = np.linalg.solve(M, rhs)[:, :, 0].T
+        else:
+            x_f = self.__solve_foreground(rows[ff], cols[ff], delta[ff])
+
+        # background and IO, all iterations at once
+        rest = ~ff
+        rhs = self._y[nf:].reshape(-1, 1) + self._A[nf:, :nf].dot(x_f)
+        np.add.at(rhs, rows[rest] - nf, delta[rest] * x_f[cols[rest]])
+        if rhs.shape[0]:
+            if self._lu is None:
+                self._lu = factorize(self._A[nf:, nf:])
+            x_rest = self._lu.solve(rhs)
+        else:
+            x_rest = rhs
+        x = np.vstack((x_f, x_rest))
+        if self.stage == 'production':
+            return x
+
+        rows, cols, delta = samples['F']
+        e = self._F.dot(x)
+        np.add.at(e, rows, delta * x_f[cols])
+        if self.stage == 'emissions':
+            return e
+        return self._C.dot(e)
+
+    def __solve_foreground(self, rows, cols, delta):
+        """ Foreground systems of a batch, as low-rank updates of one
+        factorization
+
+        Perturbations of A_ff only ever affect the k columns with uncertain
+        entries: as in LowRankUpdate, (I - A_ff - P) = (I - A_ff) - D V^T,
+        with D the k perturbed columns of P. With W = (I - A_ff)^-1 for the
+        r perturbed rows (computed once), and S the r x k perturbations of an
+        iteration, (I - A_ff)^-1 D = W S, and the Sherman-Morrison-Woodbury
+        formula solves all iterations at once, through a stack of k x k
+        systems.
+
+        Args
+        ----
+            * rows, cols, delta: perturbed entries of A_ff, as in sample()
+
+        Returns
+        -------
+            * foreground production, of shape (nf, batch)
+        """
+        nf = self._nf
+        batch = delta.shape[1]
+        perturbed_rows, r = np.unique(rows, return_inverse=True)
+        perturbed_cols, c = np.unique(cols, return_inverse=True)
+
+        if self._lu_ff is None:
+            lu = factorize(self._A[:nf, :nf])
+            self._lu_ff = (lu, lu.solve(self._y[:nf]), None, None)
+        lu, z, cached_rows, W = self._lu_ff
+        if not len(rows):
+            return np.tile(z.reshape(-1, 1), (1, batch))
+        if W is None or not np.array_equal(cached_rows, perturbed_rows):
+            E = np.zeros((nf, len(perturbed_rows)))
+            E[perturbed_rows, np.arange(len(perturbed_rows))] = 1.0
+            W = lu.solve(E)
+            self._lu_ff = (lu, z, perturbed_rows, W)
+
+        k = len(perturbed_cols)
+        S = np.zeros((batch, len(perturbed_rows), k))
+        S[:, r, c] = delta.T
+        capacitance = np.eye(k) - np.matmul(W[perturbed_cols], S)
+        w = np.linalg.solve(capacitance,
+                            np.tile(z[perturbed_cols].reshape(1, k, 1),
+                                    (batch, 1, 1)))
+        return z.reshape(-1, 1) + W.dot(np.matmul(S, w)[:, :, 0].T)
+
+
+class StreamingStatistics(object):
+    """ Statistics over many samples of a vector, in bounded memory
+
+    Means and variances are updated batch by batch (Welford/Chan), extremes
+    are tracked exactly, and percentiles are estimated from a uniform random
+    subset (reservoir) of the samples of fixed size.
+    """
+
+    def __init__(self, size, reservoir_size=1000, rng=None):
+        self.n = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.reservoir = np.empty((size, 0))
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(rng)
+
+    def update(self, batch):
+        """ Add samples, one per column of batch """
+        batch = np.asarray(batch, dtype=float)
+        n = batch.shape[1]
+        if not n:
+            return
+        mean = batch.mean(axis=1)
+        m2 = ((batch - mean[:, None]) ** 2).sum(axis=1)
+        self.__combine(n, mean, m2)
+        self.min = np.minimum(self.min, batch.min(axis=1))
+        self.max = np.maximum(self.max, batch.max(axis=1))
+
+        # reservoir sampling: sample t replaces a random kept one with
+        # probability reservoir_size / t
+        free = self.reservoir_size - self.reservoir.shape[1]
+        self.reservoir = np.hstack((self.reservoir, batch[:, :free]))
+        t = self.n - n + np.arange(free, n) + 1
+        slot = (self.rng.random(len(t)) * t).astype(int)
+        kept = slot < self.reservoir_size
+        self.reservoir[:, slot[kept]] = batch[:, free:][:, kept]
+
+    def merge(self, other):
+        """ Combine with statistics of other, independent samples """
+        if not other.n:
+            return
+        n = self.n
+        self.__combine(other.n, other.mean, other.m2)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+        # keep samples of each reservoir in proportion to their numbers
+        mine = int(round(self.reservoir_size * n / float(self.n)))
+        mine = min(mine, self.reservoir.shape[1])
+        theirs = min(self.reservoir_size - mine, other.reservoir.shape[1])
+        self.reservoir = np.hstack((
+            self.reservoir[:, self.rng.permutation(
+                self.reservoir.shape[1])[:mine]],
+            other.reservoir[:, self.rng.permutation(
+                other.reservoir.shape[1])[:theirs]]))
+
+    def __combine(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / float(total)
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * n / float(total)
+        self.n = total
+
+    @property
+    def std(self):
+        """ Sample standard deviation """
+        if self.n < 2:
+            return np.full(len(self.mean), np.nan)
+        return np.sqrt(self.m2 / (self.n - 1))
+
+    def summary(self, labels=None, percentiles=(2.5, 50, 97.5)):
+        """ DataFrame of mean, std, min, max and percentiles, per label """
+        summary = pd.DataFrame({'mean': self.mean, 'std': self.std,
+                                'min': self.min, 'max': self.max},
+                               index=labels,
+                               columns=['mean', 'std', 'min', 'max'])
+        for p in percentiles:
+            summary['p{:g}'.format(p)] = np.percentile(self.reservoir, p,
+                                                       axis=1)
+        return summary
+
+
+def _draw(rng, distribution, params, batch):
+    """ Samples of many coefficients following the same type of distribution
+
+    Args
+    ----
+        * rng: numpy random Generator
+        * distribution: 'lognormal', 'normal', 'uniform' or 'triangular'
+        * params: list of dictionaries of parameters, one per coefficient
+        * batch: number of samples of each coefficient
+
+    Returns
+    -------
+        * array of samples, of shape (len(params), batch)
+    """
+    def column(name):
+        return np.array([float(p[name]) for p in params]).reshape(-1, 1)
+
+    size = (len(params), batch)
+    if distribution == 'lognormal':
+        return column('median') * rng.lognormal(0.0, column('sigma'), size)
+    if distribution == 'normal':
+        return rng.normal(column('mean'), column('sd'), size)
+    if distribution == 'uniform':
+        return rng.uniform(column('low'), column('high'), size)
+    if distribution == 'triangular':
+        return rng.triangular(column('low'), column('mode'), column('high'),
+                              size)
+    raise ValueError("Unknown distribution {}".format(distribution))
+
+
+def _monte_carlo_worker(args):
+    montecarlo, iterations, batch_size, seed, reservoir_size = args
+    return montecarlo._run_batches(iterations, batch_size, seed,
+                                   reservoir_size)
+
+# -----------------------SCENARIO WORKERS--------------------------------------
+#
+_SCENARIO_BASE = None
+
+
+def _init_scenario_worker(base, shared_background=None):
+    """ Keep the LCAIO object shared by all scenarios of a worker process
+
+    Args
+    ----
+        * base: LCAIO object, or its foreground only if shared_background
+        * shared_background: directory written by save_shared_background(),
+                             to attach base to
+    """
+    global _SCENARIO_BASE
+    if shared_background is not None:
+        base.attach_shared_background(shared_background,
+                                      reset_foreground_io=False)
+    _SCENARIO_BASE = base
+
+
+def _run_scenario_in_worker(item):
+    scenario, stage = item
+    return _SCENARIO_BASE._run_scenario(scenario, stage)
+
+# -----------------------PERSISTENCE-------------------------------------------
+#
+def write_table(frame, filename):
+    """ Write DataFrame with arbitrary labels to Parquet file
+
+    Index levels and columns are stored positionally (i0, i1..., c0, c1...),
+    and object columns that are not all strings (IDs, tuples, mixed types) are
+    stored as JSON, so that all labels survive the round trip unchanged.
+
+    Returns
+    -------
+        JSON-serializable description of the table, needed by read_table()
+    """
+    meta = {'index_names': _tag(list(frame.index.names)),
+            'multiindex': isinstance(frame.index, pd.MultiIndex),
+            'columns': _tag(list(frame.columns)),
+            'columns_names': _tag(list(frame.columns.names)),
+            'multicolumns': isinstance(frame.columns, pd.MultiIndex),
+            'json': [],
+            'object': []}
+
+    table = {}
+    columns = [('i%d' % j, frame.index.get_level_values(j))
+               for j in range(frame.index.nlevels)]
+    columns += [('c%d' % j, frame.iloc[:, j]) for j in range(frame.shape[1])]
+    for key, values in columns:
+        column = pd.Series(values).reset_index(drop=True)
+        if column.dtype == object:
+            meta['object'].append(key)
+            if not column.map(lambda x: isinstance(x, str)).all():
+                column = column.map(lambda x: json.dumps(_tag(x)))
+                meta['json'].append(key)
+        table[key] = column
+
+    pd.DataFrame(table, columns=[key for key, __ in columns]
+                 ).to_parquet(filename)
+    return meta
+
+
+def read_table(filename, meta):
+    """ Read DataFrame written by write_table() """
+    table = pd.read_parquet(filename)
+
+    def column(key):
+        values = table[key]
+        if key in meta['json']:
+            values = values.map(lambda x: _untag(json.loads(x)))
+        if key in meta['object']:
+            values = values.astype(object)
+        return values.values
+
+    names = _untag(meta['index_names'])
+    levels = [column('i%d' % j) for j in range(len(names))]
+    if meta['multiindex']:
+        index = pd.MultiIndex.from_arrays(levels, names=names)
+    else:
+        index = pd.Index(levels[0], name=names[0], tupleize_cols=False)
+
+    columns = pd.Index(_untag(meta['columns']),
+                       tupleize_cols=meta['multicolumns'])
+    if meta['multicolumns']:
+        columns.names = _untag(meta['columns_names'])
+    else:
+        columns.name = _untag(meta['columns_names'])[0]
+
+    frame = pd.DataFrame({j: column('c%d' % j) for j in range(len(columns))},
+                         index=index, columns=range(len(columns)))
+    frame.columns = columns
+    return frame
+
+
+def _tag(value):
+    """ JSON-serializable version of labels, keeping tuples and dicts apart"""
+    if isinstance(value, tuple):
+        return {'__tuple__': [_tag(i) for i in value]}
+    if isinstance(value, list):
+        return [_tag(i) for i in value]
+    if isinstance(value, dict):
+        return {'__dict__': [[_tag(k), _tag(v)] for k, v in value.items()]}
+    if isinstance(value, np.ndarray):
+        return [_tag(i) for i in value.tolist()]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _untag(value):
+    """ Labels from their JSON-serializable version, see _tag() """
+    if isinstance(value, list):
+        return [_untag(i) for i in value]
+    if isinstance(value, dict):
+        if '__tuple__' in value:
+            return tuple(_untag(i) for i in value['__tuple__'])
+        return {_untag(k): _untag(v) for k, v in value['__dict__']}
+    return value
+
+# -----------------------MATLAB FILE ACCESS-----------------------------------
+#
+class MatFile(Mapping):
+    """ Read-only, lazy dictionary of the variables of a Matlab .mat file
+
+    Variables are only read from disk when first accessed (or preloaded), and
+    then kept in memory. Variables that are never accessed are never decoded.
+
+    Handles v4 to v7 files through scipy.io, and v7.3 (HDF5) files through
+    h5py, reading sparse matrices directly from their HDF5 datasets.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.hdf5 = is_hdf5(filename)
+        self._values = {}
+        if self.hdf5:
+            if h5py is None:
+                raise ImportError("h5py is needed to read Matlab v7.3 file {}"
+                                  .format(filename))
+            with h5py.File(filename, 'r') as f:
+                self._keys = [k for k in f.keys() if not k.startswith('#')]
+        else:
+            self._keys = [i[0] for i in sio.whosmat(filename)]
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in self._keys:
+                raise KeyError(key)
+            self.preload([key])
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def preload(self, keys):
+        """ Read variables that are not yet in memory, in a single pass """
+        keys = [k for k in keys if k in self._keys and k not in self._values]
+        if not len(keys):
+            return
+        if self.hdf5:
+            with h5py.File(self.filename, 'r') as f:
+                for k in keys:
+                    self._values[k] = _read_hdf5_variable(f, f[k])
+        else:
+            self._values.update(
+                    (k, v) for k, v in sio.loadmat(self.filename,
+                                                   variable_names=keys).items()
+                    if k in keys)
+
+
+def open_matsource(datasource, variable_names=None):
+    """ Dictionary-like access to Matlab variables, from file or dictionary
+
+    Args
+    ----
+        * datasource: filename of Matlab .mat file, or dictionnary (e.g.,
+                      produced by scipy.io.loadmat())
+        * variable_names: variables to read right away from file (in one
+                          pass); all others only get read upon access
+    """
+    if isinstance(datasource, Mapping):
+        return datasource
+    source = MatFile(datasource)
+    if variable_names is not None:
+        source.preload(variable_names)
+    return source
+
+
+def is_hdf5(filename):
+    """ Whether a file is HDF5-based, e.g., a Matlab v7.3 file """
+    with open(filename, 'rb') as f:
+        f.seek(512)
+        return f.read(8) == b'\x89HDF\r\n\x1a\n'
+
+
+def _read_hdf5_variable(f, node):
+    """ Read Matlab variable from v7.3 file, mimicking scipy.io.loadmat() """
+
+    attrs = node.attrs
+    matlab_class = attrs.get('MATLAB_class', b'')
+    if isinstance(matlab_class, bytes):
+        matlab_class = matlab_class.decode()
+
+    # sparse matrix: group of CSC arrays (data, ir, jc)
+    if 'MATLAB_sparse' in attrs:
+        nrows = int(attrs['MATLAB_sparse'])
+        jc = node['jc'][()]
+        ir = node['ir'][()] if 'ir' in node else np.zeros(0, dtype=np.int64)
+        if 'data' in node:
+            data = node['data'][()]
+        else:
+            data = np.zeros(len(ir))
+        return scipy.sparse.csc_matrix((data, ir, jc),
+                                       shape=(nrows, len(jc) - 1))
+
+    # Matlab stores arrays column-major, hence all the transpositions
+    value = node[()]
+    if attrs.get('MATLAB_empty', 0):
+        # empty cells of label tables: loadmat() returns 1-D empty strings
+        if matlab_class == 'char':
+            return np.array([], dtype='<U1')
+        return np.zeros((0, 0), dtype=object if matlab_class == 'cell'
+                        else float)
+    if matlab_class == 'cell':
+        out = np.empty(value.shape, dtype=object)
+        for index, ref in np.ndenumerate(value):
+            out[index] = _read_hdf5_variable(f, f[ref])
+        return out.T
+    if matlab_class == 'char':
+        chars = np.atleast_2d(value).T
+        return np.array([''.join(chr(c) for c in row) for row in chars])
+    return np.atleast_2d(value).T
+
 # -----------------------SUPPORTING MODULE FUNCTIONS--------------------------
+
+# tracemalloc.reset_peak() only exists from Python 3.9 on
+_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')
+
+
+def _stage_peak(frame, current, peak):
+    """ Peak memory traced since a stage started, see LCAIO._stage()
+
+    Args
+    ----
+        * frame: frame of the stage, with the traced peak at its start
+                 ('baseline'), or -1 if the peak was reset then
+        * current, peak: as returned by tracemalloc.get_traced_memory()
+    """
+    if peak > frame['baseline']:
+        return peak
+    return current  # peak reached before the stage, best lower bound
+
+
+class LCAIOLog(logging.LoggerAdapter):
+    """ Log of one LCAIO object
+
+    Records go to a logger of the 'pylcaio' hierarchy, and propagate to
+    whatever handlers the application configured. Objects neither verbose
+    nor with a log file log on 'pylcaio' itself, which is never configured.
+    Otherwise, they log on a child logger, at level INFO: 'pylcaio.verbose',
+    with a console handler unless the application has configured logging
+    (its handlers then get the records), and/or 'pylcaio[.verbose].file<n>',
+    with a handler to the log file, shared by all objects writing to it and
+    closed with the last of them, see close().
+
+    Args
+    ----
+        * verbose: whether to also log to the console (stderr)
+        * logfile: file to also write the log to
+    """
+
+    def __init__(self, verbose=False, logfile=None):
+        self.verbose = verbose
+        self.logfile = None if logfile is None else os.path.abspath(logfile)
+        name = _log.name
+        if verbose:
+            name += '.verbose'
+            _configure_console(logging.getLogger(name))
+        if self.logfile is not None:
+            name += '.file{}'.format(_open_logfile(self.logfile))
+        logger = logging.getLogger(name)
+        if logger is not _log:
+            logger.setLevel(logging.INFO)
+        if self.logfile is not None and \
+                _LOG_FILES[self.logfile][1] not in logger.handlers:
+            logger.addHandler(_LOG_FILES[self.logfile][1])
+        super(LCAIOLog, self).__init__(logger, {})
+
+    def __reduce__(self):
+        # handlers hold streams; workers open their own
+        return type(self), (self.verbose, self.logfile)
+
+    def close(self):
+        """ Stop writing to the log file, closed once no object uses it """
+        if self.logfile is None:
+            return
+        number, handler, users = _LOG_FILES[self.logfile]
+        if users > 1:
+            _LOG_FILES[self.logfile][2] -= 1
+        else:
+            del _LOG_FILES[self.logfile]
+            for suffix in ('', '.verbose'):
+                logger = logging.getLogger('{}{}.file{}'.format(
+                        _log.name, suffix, number))
+                if handler in logger.handlers:
+                    logger.removeHandler(handler)
+            handler.close()
+        self.logfile = None
+
+
+# Log files open, by absolute path: [number, handler, number of users]
+_LOG_FILES = {}
+_LOG_FILE_NUMBERS = itertools.count()
+
+
+def _open_logfile(logfile):
+    """ Number of the shared handler to an absolute logfile path, opened on
+    first use """
+    try:
+        _LOG_FILES[logfile][2] += 1
+    except KeyError:
+        handler = logging.FileHandler(logfile)
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+        _LOG_FILES[logfile] = [next(_LOG_FILE_NUMBERS), handler, 1]
+    return _LOG_FILES[logfile][0]
+
+
+def _configure_console(logger):
+    """ Console handler on the logger of verbose objects, only as long as the
+    application has not configured logging itself """
+    ours = [i for i in logger.handlers if getattr(i, '_pylcaio', False)]
+    logger.handlers = [i for i in logger.handlers if i not in ours]
+    configured = logger.hasHandlers()
+    if not configured:
+        handler = ours[0] if ours else logging.StreamHandler()
+        handler._pylcaio = True
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+        logger.addHandler(handler)
+
+
+def matrix_size(block):
+    """ Shape, number of non-zero entries and density of a block, for
+    metrics; only the shape for non-numeric tables (e.g., labels) """
+    if isinstance(block, SparseFrame):
+        block = block.matrix
+    if scipy.sparse.issparse(block):
+        shape, nnz = block.shape, block.nnz
+    else:
+        values = np.asarray(getattr(block, 'values', block))
+        shape = values.shape
+        if values.dtype.kind not in 'biuf':
+            return {'shape': [int(i) for i in shape]}
+        nnz = np.count_nonzero(values)
+    cells = int(np.prod(shape))
+    return {'shape': [int(i) for i in shape],
+            'nnz': int(nnz),
+            'density': nnz / cells if cells else 0.0}
+
 #
 def concat_keep_order(frame_list, index, axis=0, order_axis=[0]):
+    if any(isinstance(i, SparseFrame) for i in frame_list):
+        # Position blocks by label; the axes that are not ordered take the
+        # union of all labels, as a pd.concat would
+        labels = []
+        for ax, attr in ((0, 'index'), (1, 'columns')):
+            if ax in order_axis:
+                labels.append(index)
+            else:
+                labels.append(_union_labels([getattr(i, attr)
+                                             for i in frame_list]))
+        return assemble_blocks(frame_list, labels[0], labels[1])
+
     c = pd.concat(frame_list, axis).fillna(0.0)
     for i in order_axis:
         c = c.reindex_axis(index, axis=i)
     return c
 
+def _union_labels(indexes):
+    """ Union of labels, keeping order of first appearance """
+    union = indexes[0]
+    for i in indexes[1:]:
+        union = union.append(i[~i.isin(union)])
+    return union
+
+
 def extract_header(header):
     """
 
@@ -902,25 +3891,141 @@ def generate_fullname(label, header, name_cols):
     header = ['FULLNAME'] + header
     return label, header
 
+def compact_labels(table):
+    """ Label table with compact columns, same index and column labels
+
+    Strings repeated across rows (locations, units, compartments...) are
+    stored as categoricals, and integral IDs (e.g., MATRIXID) as integers.
+    Mostly unique strings (e.g., full names) and mixed columns remain
+    objects, which would not be any smaller as categoricals.
+    """
+    columns = {}
+    for j in range(table.shape[1]):
+        column = table.iloc[:, j]
+        typed = _typed_column(column.values)
+        if isinstance(typed.dtype, pd.CategoricalDtype) and \
+                len(typed.cat.categories) > len(typed) // 2:
+            typed = column
+        columns[j] = typed.values
+    compact = pd.DataFrame(columns, index=table.index,
+                           columns=range(table.shape[1]))
+    compact.columns = table.columns
+    return compact
+
+
+def concat_labels(tables):
+    """ Concatenate label tables by rows, keeping their columns compact
+
+    Equivalent to pd.concat(tables).fillna(''), but categorical columns get
+    their categories merged (only their integer codes are copied) instead of
+    falling back to objects, and integer columns remain integers.
+    """
+    names = []
+    for table in tables:
+        names.extend(i for i in table.columns if i not in names)
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return pd.DataFrame(columns=names)
+    index = tables[0].index.append([table.index for table in tables[1:]])
+
+    columns = {}
+    for j, name in enumerate(names):
+        parts = [table[name].values if name in table.columns
+                 else np.full(len(table), '', dtype=object)
+                 for table in tables]
+        if any(isinstance(i, pd.Categorical) for i in parts) and all(
+                isinstance(i, pd.Categorical) or
+                all(isinstance(x, str) for x in i) for i in parts):
+            columns[j] = pd.api.types.union_categoricals(
+                    [pd.Categorical(i) for i in parts])
+        elif all(i.dtype.kind in 'iu' for i in parts):
+            columns[j] = np.concatenate(parts)
+        else:
+            column = pd.Series(np.concatenate([np.asarray(i, dtype=object)
+                                               for i in parts]))
+            columns[j] = column.where(column.notnull(), '').values
+    labels = pd.DataFrame(columns, index=index, columns=range(len(names)))
+    labels.columns = names
+    return labels
+
+
 def reorder_cols(a):
     cols = a.columns.difference(['FULLNAME', 'MATRIXID','UNIT'])
     sorted_cols = ['FULLNAME','MATRIXID'] + cols.tolist() + ['UNIT']
     return a.reindex_axis(sorted_cols, 1)
 
 def i2s(a):
+    """ Flatten multiindexes to indexes of tuples, on a shallow copy """
+    a = a.copy(deep=False)
     a.index = a.index.to_series()
     a.columns = a.columns.to_series()
     return a
 
+def read_characterisation(char_filename, xlschar_param, cache_dir=None):
+    """ Read characterisation factors from all sheets of a spreadsheet
+
+    The workbook is parsed only once for all sheets. With a cache_dir, the
+    resulting matrix is also pickled there, under a key hashing the content
+    of the spreadsheet and xlschar_param, such that later calls skip Excel
+    parsing altogether, until either changes.
+
+    Args
+    ----
+        - char_filename:    filename of spreadsheet to read
+        - xlschar_param:    dictionary of sheet names and reading parameters
+                            (index headers, column headers, rows to drop,
+                            columns to drop)
+        - cache_dir:        directory of cached parsed spreadsheets
+                                [default None, no caching]
+
+    Returns
+    -------
+        DataFrame of characterisation factors, impacts x stressors
+    """
+    if cache_dir is not None:
+        digest = hashlib.sha256()
+        with open(char_filename, 'rb') as f:
+            for chunk in iter(functools.partial(f.read, 2**20), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(_tag(xlschar_param), sort_keys=True
+                                 ).encode())
+        cached = os.path.join(cache_dir,
+                              'characterisation_' + digest.hexdigest() + '.pkl')
+        if os.path.exists(cached):
+            return pd.read_pickle(cached)
+
+    # find widest index and columns
+    max_index = max(len(par[0]) for par in xlschar_param.values())
+    max_cols = max(len(par[1]) for par in xlschar_param.values())
+
+    # read in all sheets at once
+    sheets = pd.read_excel(char_filename, list(xlschar_param.keys()),
+                           index_col=None, header=None)
+    C = []
+    for key, par in xlschar_param.items():
+        c = extract_char(char_filename, key, par[0], par[1], par[2], par[3],
+                         raw=sheets[key])
+        c.index = augment_index(c.index, max_index)
+        c.columns = augment_index(c.columns, max_cols)
+        C.append(c)
+    C = pd.concat(C, join='outer')
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        C.to_pickle(cached)
+    return C
+
+
 def extract_char(char_filename, sheet,
-                 index_headers, col_headers, drop_rows, drop_cols):
+                 index_headers, col_headers, drop_rows, drop_cols, raw=None):
     # width of columns and headers
     col_width=len(col_headers)
     index_width=len(index_headers)
 
-    # read in whole sheet
-    raw = pd.read_excel(char_filename,
-                        sheet, index_col=None, header=None)
+    # read in whole sheet, unless already read
+    if raw is None:
+        raw = pd.read_excel(char_filename,
+                            sheet, index_col=None, header=None)
     # remove extraneous rows and columns
     if drop_rows is not None:
         raw = raw.drop(drop_rows, axis=0)
@@ -939,6 +4044,12 @@ def extract_char(char_filename, sheet,
             )
     return df
 
+def _label_array(index):
+    """ Object array of labels, with one column per level of (Multi)Index """
+    return np.column_stack([np.asarray(index.get_level_values(j), dtype=object)
+                            for j in range(index.nlevels)])
+
+
 def augment_index(index, width=None, headers=None):
     index = index.copy()
     tmp = []
@@ -971,37 +4082,106 @@ def mine_nested_array(nested_array, null_value=0):
         In: ec.mine_nested_array(a)
         Out: array([0, 1])
 
+    See decode_labels() for a faster equivalent on large label tables.
     """
 
-    def _mine(a):
-        """ Subfunction that handles the looping through the nested arrays"""
-        try:
-            b = a.copy()
-            __ = b.shape
-        except:
-            # Not a numpy array, return as is
-            return a
-
-        # Go deeper until you reach an array whith more than 1 entry
-        while b.shape == (1, 1):
-            b = b[0, 0]
-        while b.shape == (1,):
-            b = b[0]
-        if b.shape == (0,):
-            b = null_value
-
-        return b
-
     # First. mine for a "real" array or data
-    c = _mine(nested_array)
+    c = _mine(nested_array, null_value)
 
     try:
         # Second. loop through all elements of this array, and mine them if
         # they themselves contain nested arrays
         for index, x in np.ndenumerate(c):
-            c[index] = _mine(x)
+            c[index] = _mine(x, null_value)
     except:
         pass  # probably mined-out something that is not an array, good
 
     return c
 
+
+def _mine(a, null_value=0):
+    """ Handles the looping through the nested arrays of a single entry"""
+    try:
+        b = a.copy()
+        __ = b.shape
+    except:
+        # Not a numpy array, return as is
+        return a
+
+    # Go deeper until you reach an array whith more than 1 entry
+    while b.shape == (1, 1):
+        b = b[0, 0]
+    while b.shape == (1,):
+        b = b[0]
+    if b.shape == (0,):
+        b = null_value
+
+    return b
+
+
+def decode_labels(nested_array, null_value=0, typed=False):
+    """ Vectorized equivalent of mine_nested_array() for label tables
+
+    Unwraps the cells of a label table (e.g., PRO_gen as loaded by
+    scipy.io.loadmat()) column by column: the common case of a column of
+    single-valued cells gets unwrapped in bulk, and only irregular cells (empty
+    or deeper nested) get mined one by one.
+
+    Args
+    ----
+        * nested_array: label table, as loaded by scipy.io.loadmat()
+        * null_value: value of empty cells
+        * typed: if False, return an object array identical to that of
+                 mine_nested_array(); if True, return a DataFrame of typed
+                 columns (strings as categoricals, integer IDs as integers)
+
+    """
+    c = _mine(nested_array, null_value)
+
+    if not isinstance(c, np.ndarray) or c.ndim != 2:
+        c = mine_nested_array(nested_array, null_value)
+    elif c.dtype == object:
+        c = c.copy()
+        for j in range(c.shape[1]):
+            c[:, j] = _decode_column(c[:, j], null_value)
+
+    if not typed:
+        return c
+    return pd.DataFrame({j: _typed_column(np.atleast_2d(c)[:, j])
+                         for j in range(np.atleast_2d(c).shape[1])})
+
+
+def _decode_column(cells, null_value):
+    """ Unwraps a column of label cells, in bulk whenever possible """
+    try:
+        kinds = {cell.dtype.kind for cell in cells}
+    except AttributeError:
+        kinds = set()  # not all cells are arrays
+
+    # Only stack cells of a single kind, which no coercion can change
+    if len(kinds) == 1:
+        try:
+            # Stacks single-valued cells of homogeneous shape in one call
+            values = np.array(cells.tolist())
+        except ValueError:
+            values = None  # ragged cells
+        if values is not None and values.dtype != object and \
+                values.size == len(cells):
+            return values.reshape(-1).astype(object)
+
+    return [_mine(cell, null_value) for cell in cells]
+
+
+def _typed_column(column):
+    """ Categorical for string labels, integers for integral IDs """
+    column = pd.Series(column)
+    if column.map(lambda x: isinstance(x, str)).all():
+        return column.astype('category')
+    try:
+        numbers = pd.to_numeric(column)
+    except (ValueError, TypeError):
+        return column
+    if (numbers == np.round(numbers)).all():
+        return numbers.astype(np.int64)
+    return numbers
+
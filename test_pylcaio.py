@@ -9,6 +9,11 @@ import pandas.util.testing as pdt
 sys.path.append(r'C:\Users\Maxime\Desktop\Software\pymrio-master')
 import pymrio
 import os
+import json
+import logging
+import pickle
+import shutil
+import benchmark_pylcaio
 
 
 class Testpylcaio(unittest.TestCase):
@@ -175,6 +180,25 @@ class Testpylcaio(unittest.TestCase):
         self.assertAlmostEqual(a.F_io.values.sum(), self.mrio.emissions.S.values.sum() +
                                       self.mrio.factor_inputs.S.values.sum())
 
+    def test_extract_io_background_from_pymrio_sparse(self):
+
+        a = pylcaio.LCAIO(verbose=False, sparse=True)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        for block in (a.A_io, a.F_io, a.A_io_f, a.F_io_f):
+            assert(isinstance(block, pylcaio.SparseFrame))
+        assert(a.A_io_f.shape == (len(a.PRO_io), len(a.PRO_f)))
+        assert(a.STR_io.index.equals(a.F_io.index))
+        self.assertAlmostEqual(a.F_io.matrix.sum(),
+                               self.mrio.emissions.S.values.sum() +
+                               self.mrio.factor_inputs.S.values.sum())
+
+        # extracting anew replaces, does not accumulate, extensions
+        n = len(a.F_io)
+        a.extract_io_background_from_pymrio(self.mrio)
+        assert(len(a.F_io) == n)
+
     def test_match_foreground_background_trivial(self):
         a = pylcaio.LCAIO(verbose=False)
         a.extract_background(self.matdict)
@@ -523,6 +547,191 @@ class Testpylcaio(unittest.TestCase):
         self.assertTrue(np.all(a.A_io_f >= A_io_f_0))
 
 
+    def test_hybridize_all(self):
+
+        hyb = [(('Batt Packing', 10002), ('reg2', 'transport'), 0.1),
+               (('s+orm', 10005), ('reg1', 'food'), 2.0)]
+
+        for sparse in (False, True):
+            a = pylcaio.LCAIO([0,1], verbose=False, sparse=sparse)
+            b = pylcaio.LCAIO([0,1], verbose=False, sparse=sparse)
+            for i in (a, b):
+                mrio = pymrio.load_test()
+                mrio.calc_all()
+                i.extract_background(self.matdict)
+                i.extract_foreground(self.matdict)
+                i.extract_io_background_from_pymrio(mrio)
+                i.io_categories['material']=['mining']
+
+            for process, sector, price in hyb:
+                a.hybridize_process(process, sector, price,
+                        doublecounted_intrasector=0.5,
+                        doublecounted_categories=('material',),
+                        doublecounted_sectors=(('reg1', 'electricity'),))
+
+            b.hyb = pd.DataFrame(hyb, columns=['process_index', 'io_index',
+                                               'price_per_fu'])
+            b.hybridize_all(doublecounted_intrasector=0.5,
+                            doublecounted_categories=('material',),
+                            doublecounted_sectors=(('reg1', 'electricity'),))
+
+            np.testing.assert_allclose(pylcaio.to_csc(a.A_io_f).toarray(),
+                                       pylcaio.to_csc(b.A_io_f).toarray())
+            np.testing.assert_allclose(pylcaio.to_csc(a.A).toarray(),
+                                       pylcaio.to_csc(b.A).toarray())
+            # prices applied by hybridize_process() recorded as well
+            self.assertEqual(a.hyb.values.tolist(), b.hyb.values.tolist())
+
+            # no overwrite by default
+            A_io_f_0 = pylcaio.to_csc(b.A_io_f).toarray()
+            b.hyb['price_per_fu'] = 1E9
+            b.hybridize_all()
+            np.testing.assert_allclose(A_io_f_0,
+                                       pylcaio.to_csc(b.A_io_f).toarray())
+
+    def test_doublecounting_filter(self):
+
+        hyb = pd.DataFrame([(('Batt Packing', 10002), ('reg2', 'transport'),
+                             0.1)],
+                           columns=['process_index', 'io_index',
+                                    'price_per_fu'])
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        a.io_categories['material'] = ['mining']
+
+        f = a.build_doublecounting_filter(0.5, ('material',))
+        assert(a.doublecounting is f)
+        self.assertEqual(f.toarray()[f.index.get_loc('mining')].tolist(),
+                         [1.0] * len(f.columns))
+        self.assertEqual(f.toarray()[f.index.get_loc('food'),
+                                     f.columns.get_loc('food')], 0.5)
+        self.assertEqual(f.toarray().sum(), len(f.columns) +
+                         0.5 * (len(f.columns) - 1))
+
+        # saved along, and reusable by another object
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+        path = os.path.join(temporary, 'test_doublecounting')
+        shutil.rmtree(path, ignore_errors=True)
+        a.save(path)
+        b = pylcaio.LCAIO.load(path, verbose=False)
+        shutil.rmtree(path)
+        np.testing.assert_allclose(b.doublecounting.toarray(), f.toarray())
+
+        a.hyb = b.hyb = hyb
+        a.hybridize_all(0.5, ('material',))
+        b.hybridize_all(doublecounting=b.doublecounting)
+        np.testing.assert_allclose(a.A_io_f.toarray(), b.A_io_f.toarray())
+
+        b.A_io_f = pylcaio.SparseFrame.zeros(b.A_io.index, b.A_ff.columns)
+        with self.assertRaises(ValueError):
+            b.hybridize_all(doublecounting=f.reindex(index=f.index[1:]))
+
+    def test_compact_labels(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+
+        # repeated strings as categoricals, IDs as integers, unique names kept
+        self.assertEqual(a.PRO_io['SECTOR'].dtype, 'category')
+        self.assertEqual(a.PRO_io['MATRIXID'].dtype, np.int64)
+        self.assertEqual(a.PRO_b['MATRIXID'].dtype, np.int64)
+        self.assertNotEqual(a.PRO_b['FULLNAME'].dtype, 'category')
+
+        # same content as plain concatenation
+        pro = pd.concat([i.astype(object) for i in (a.PRO_f, a.PRO_b,
+                                                    a.PRO_io)]).fillna('')
+        pro = pylcaio.reorder_cols(pro)
+        assert(a.PRO.index.equals(pro.index))
+        self.assertEqual(list(a.PRO.columns), list(pro.columns))
+        self.assertEqual(a.PRO.astype(object).values.tolist(),
+                         pro.values.tolist())
+        self.assertEqual(a.PRO['UNIT'].dtype, 'category')
+        self.assertEqual(a.PRO['MATRIXID'].dtype, np.int64)
+
+    def test_label_registry(self):
+
+        first = pd.Index(['a', 'b'])
+        second = pd.Index(['c', 'a', 'd'])
+        registry = pylcaio.LabelRegistry([('first', first),
+                                          ('second', second)])
+        self.assertEqual(len(registry), 5)
+        self.assertEqual(registry.offsets, {'first': 0, 'second': 2})
+        self.assertEqual(registry.slice('second'), slice(2, 5))
+        self.assertEqual(registry.locate('second', second).tolist(), [2, 3, 4])
+        self.assertEqual(registry.locate('second', pd.Index(['d', 'x'])
+                                         ).tolist(), [4, -1])
+        self.assertEqual(registry.index.tolist(), ['a', 'b', 'c', 'a', 'd'])
+
+        # same label in two groups, placed by group
+        A_11 = pd.DataFrame([[0.0, 1.0], [2.0, 0.0]], first, first)
+        A_21 = pylcaio.SparseFrame(scipy.sparse.csc_matrix([[0.0, 3.0],
+                                                            [4.0, 0.0],
+                                                            [0.0, 0.0]]),
+                                   pd.Index(['a', 'c', 'x']), first)
+        A = registry.assemble([(A_11, 'first', 'first'),
+                               (A_21, 'second', 'first'),
+                               (None, 'second', 'second')])
+        expected = np.zeros((5, 5))
+        expected[:2, :2] = A_11.values
+        expected[3, 1] = 3.0
+        expected[2, 0] = 4.0
+        np.testing.assert_allclose(A.toarray(), expected)
+
+        # same whole-system matrices in dense and sparse mode
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        for i in (a, b):
+            i.extract_background(self.matdict)
+            i.extract_foreground(self.matdict)
+            i.extract_io_background_from_pymrio(self.mrio)
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+        for name in ('A', 'F', 'C_all'):
+            np.testing.assert_allclose(
+                    np.nan_to_num(np.asarray(getattr(a, name).values,
+                                             dtype=float)),
+                    getattr(b, name).toarray())
+        self.assertEqual(len(b.PRO_registry), len(b.PRO))
+        assert(b.PRO_registry.index.equals(b.PRO.index))
+
+        # final demand placed by the same offsets
+        y = b.y
+        assert(y.index.equals(b.PRO.index))
+        np.testing.assert_allclose(
+                y.values[:, 0],
+                np.concatenate([b.y_f.values[:, 0], b.y_b.values[:, 0],
+                                b.y_io.values[:, 0]]))
+
+    def test_sector_index_and_category_masks(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+
+        sectors = a.sector_index()
+        assert(a.sector_index() is sectors)
+        rows = a.A_io.index[sectors['positions']['food']]
+        self.assertEqual(set(rows.get_level_values('sector')), {'food'})
+        self.assertEqual(len(rows), len(a.A_io.index.levels[0]))
+        with self.assertRaises(KeyError):
+            a.sector_index('industry')
+
+        a.io_categories['material'] = ['mining', 'food']
+        mask = a.category_mask('material')
+        assert(a.category_mask('material') is mask)
+        self.assertEqual(mask.sum(), 2 * len(rows))
+
+        # redefining the category gives a new mask
+        a.io_categories['material'] = ['mining']
+        self.assertEqual(a.category_mask('material').sum(), len(rows))
+
     def test_calc_lifecycle(self):
 
         a = pylcaio.LCAIO([0,1], verbose=False)
@@ -552,7 +761,898 @@ class Testpylcaio(unittest.TestCase):
                 {0: {('GWP100', 1): 0.099999999999999992}}))
         assert_frames_equivalent(d, d0)
 
+    def test_calc_lifecycle_reuses_factorization(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        x0 = a.calc_lifecycle('production')
+        lu = a._cache['lu']
+
+        # new demand, same technology: no refactorization
+        a.y_f = a.y_f * 2
+        x1 = a.calc_lifecycle('production')
+        assert(a._cache['lu'] is lu)
+        assert_frames_equivalent(x1, x0 * 2)
+
+        # new technology: refactorization
+        a.A_ff = a.A_ff * 0
+        x2 = a.calc_lifecycle('production')
+        assert(a._cache['lu'] is not lu)
+        self.assertAlmostEqual(x2.ix[('s+orm', 10005), 0], 2.0)
+
+    def test_properties_cached_and_invalidated(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+
+        A0 = a.A
+        F0 = a.F
+        assert(a.A is A0)
+        assert(a.PRO is a.PRO)
+
+        # reassigning a technology block only invalidates what depends on it
+        a.A_bf = a.A_bf * 2
+        assert(a.A is not A0)
+        assert(a.F is F0)
+        self.assertEqual(a.A.ix[('back02', 2), ('s+orm', 10005)], 2.0)
+
+        # in-place modifications need an explicit clear
+        A1 = a.A
+        a.A_ff.iloc[0, 0] = 5
+        assert(a.A is A1)
+        a.clear_cache()
+        self.assertEqual(a.A.ix[('s+orm', 10005), ('s+orm', 10005)], 5)
+
+    def test_calc_lifecycle_consumer(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        x = a.calc_lifecycle('production', perspective='consumer')
+        x0 = a.calc_lifecycle('production')
+        np.testing.assert_allclose(x.values.sum(axis=1), x0.values[:, 0])
+
+    def test_calc_lifecycle_batch(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+
+        demands = {'fu1': {('s+orm', 10005): 1.0},
+                   'fu2': {('Batt Packing', 10002): 2.0,
+                           ('back01', 1): 1.0}}
+        d = a.calc_lifecycle_batch(demands, 'impacts', chunk_size=1)
+
+        for key, demand in demands.items():
+            a.y_f = a.y_f * 0
+            a.y_b = a.y_b * 0
+            for label, value in demand.items():
+                if label[1] > 1000:
+                    a.y_f.ix[label, 0] = value
+                else:
+                    a.y_b.ix[label, 0] = value
+            d0 = a.calc_lifecycle('impacts')
+            np.testing.assert_allclose(d[key].values, d0.values[:, 0])
+
+        # final demand modified in place, no stale results
+        before = a.calc_lifecycle('impacts').values
+        a.y_f.iloc[:, 0] *= 10
+        a.y_b.iloc[:, 0] *= 10
+        np.testing.assert_allclose(a.calc_lifecycle('impacts').values,
+                                   10 * before)
+
+        with self.assertRaises(ValueError):
+            a.calc_lifecycle_batch([{('foo', 1): 1.0}])
+
+    def test_block_solver(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        b = pylcaio.LCAIO([0,1], verbose=False, solver='block')
+        for i in (a, b):
+            mrio = pymrio.load_test()
+            mrio.calc_all()
+            i.extract_background(self.matdict)
+            i.extract_foreground(self.matdict)
+            i.extract_io_background_from_pymrio(mrio)
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+
+        x = b.calc_lifecycle('production')
+        assert_frames_equivalent(a.calc_lifecycle('production'), x)
+        lu_bb = b._cache['lu_bb']
+        lu_io = b._cache['lu_io']
+
+        # foreground edits do not refactorize background nor IO
+        b.A_ff = b.A_ff * 0.5
+        b.calc_lifecycle('production')
+        assert(b._cache['lu_bb'] is lu_bb)
+        assert(b._cache['lu_io'] is lu_io)
+
+    def test_incremental_solver(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True,
+                          solver_options={'incremental': True, 'max_rank': 1})
+        for i in (a, b):
+            i.extract_background(self.matdict)
+            i.extract_foreground(self.matdict)
+            i.extract_io_background_from_pymrio(self.mrio)
+            i.calc_lifecycle('production')
+        lu = b._cache['lu']
+
+        # hybridization changes one column: low-rank update of same factors
+        for i in (a, b):
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+        assert_frames_equivalent(a.calc_lifecycle('production'),
+                                 b.calc_lifecycle('production'))
+        assert(b.solver_info['update_rank'] == 1)
+        assert(b._cache['lu'].lu is lu)
+        np.testing.assert_allclose(b._solve_transposed(np.ones(len(b.PRO))),
+                                   a._solve_transposed(np.ones(len(a.PRO))))
+
+        # too many changed columns: re-factorization
+        for i in (a, b):
+            i.A_ff = pylcaio.SparseFrame(i.A_ff.matrix * 0.5, i.A_ff.index,
+                                         i.A_ff.columns)
+        assert_frames_equivalent(a.calc_lifecycle('production'),
+                                 b.calc_lifecycle('production'))
+        assert(b.solver_info['update_rank'] == 0)
+        assert(b._cache['lu_base']['lu'] is b._cache['lu'])
+
+    def test_reachable(self):
+
+        # 0 -> 1 -> 2, and 3 -> 0
+        A = scipy.sparse.csc_matrix(([0.1, 0.2, 0.3], ([1, 2, 0], [0, 1, 3])),
+                                    shape=(4, 4))
+        self.assertEqual(pylcaio.reachable(A, [0]).tolist(),
+                         [True, True, True, False])
+        self.assertEqual(pylcaio.reachable(A, [3, 2]).tolist(),
+                         [True, True, True, True])
+        self.assertEqual(pylcaio.reachable(A, []).tolist(), [False] * 4)
+
+    def test_pruned_solver(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True,
+                          solver_options={'prune': True})
+        for i in (a, b):
+            i.extract_background(self.matdict)
+            i.extract_foreground(self.matdict)
+            i.extract_io_background_from_pymrio(self.mrio)
+        n_io = len(b.PRO_io)
+
+        # IO not reached before hybridization
+        assert_frames_equivalent(a.calc_lifecycle('production'),
+                                 b.calc_lifecycle('production'))
+        np.testing.assert_allclose(
+                a.calc_lifecycle('production', 'consumer').toarray(),
+                b.calc_lifecycle('production', 'consumer').toarray())
+        positions = b._cache['lu_pruned'][1]
+        assert(len(positions) <= len(b.PRO) - n_io)
+
+        for i in (a, b):
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+        assert_frames_equivalent(a.calc_lifecycle('impacts'),
+                                 b.calc_lifecycle('impacts'))
+        assert('lu_pruned' not in b._cache or
+               len(b._cache['lu_pruned'][1]) > len(positions))
+
+    def test_iterative_solvers(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        a.y_io.iloc[:, 0] = 1.0
+        x0 = a.calc_lifecycle('production')
+
+        for solver in ('neumann', 'gmres', 'bicgstab'):
+            for preconditioner in ('ilu', 'jacobi', None):
+                a.solver = solver
+                a.solver_options['preconditioner'] = preconditioner
+                x = a.calc_lifecycle('production')
+                np.testing.assert_allclose(x.values, x0.values, rtol=1e-6)
+                assert(a.solver_info['residual'][0] < 1e-8)
+                assert(a.solver_info['iterations'][0] > 0)
+
+        # errors of the solve itself surface as they are
+        with self.assertRaisesRegex(TypeError, 'not understood'):
+            pylcaio.krylov_solve('gmres', scipy.sparse.eye(3).tocsc(),
+                                 np.ones(3), 1e-8, 10, object())
+
+    def test_sparse_calc_lifecycle(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        b.extract_background(self.matdict)
+        b.extract_foreground(self.matdict)
+
+        assert(isinstance(b.A_bb, pylcaio.SparseFrame))
+        assert(isinstance(b.A, pylcaio.SparseFrame))
+        assert_frames_equivalent(a.A, b.A.to_frame())
+        assert_frames_equivalent(a.F, b.F.to_frame())
+
+        for stage in ('production', 'emissions'):
+            assert_frames_equivalent(a.calc_lifecycle(stage),
+                                     b.calc_lifecycle(stage))
+        np.testing.assert_allclose(a.calc_lifecycle('impacts').values,
+                                   b.calc_lifecycle('impacts').values)
+
+    def test_sparse_hybridization(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False)
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        for i in (a, b):
+            mrio = pymrio.load_test()
+            mrio.calc_all()
+            i.extract_background(self.matdict)
+            i.extract_foreground(self.matdict)
+            i.extract_io_background_from_pymrio(mrio)
+            i.io_categories['material']=['mining', 'food']
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                    0.1, doublecounted_categories=('material',))
+
+        assert(isinstance(b.A_io_f, pylcaio.SparseFrame))
+        np.testing.assert_allclose(a.A_io_f.values.astype(float),
+                                   b.A_io_f.toarray())
+        np.testing.assert_allclose(a.A.values.astype(float), b.A.toarray())
+
+    def test_sparse_to_matfile(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        a = pylcaio.LCAIO(verbose=False, sparse=True)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.to_matfile(temporary + 'test_sparse.mat')
+
+        whole = sio.loadmat(temporary + 'test_sparse.mat')
+        np.testing.assert_allclose(whole['A_gen'].toarray(), a.A.toarray())
+
+    def test_lazy_matfile(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        sio.savemat(temporary + 'test_lazy.mat', self.matdict)
+        source = pylcaio.MatFile(temporary + 'test_lazy.mat')
+        assert(set(source.keys()) == set(self.matdict.keys()))
+        assert(len(source._values) == 0)
+        np.testing.assert_allclose(source['A_gen'].toarray(),
+                                   self.matdict['A_gen'].toarray())
+        assert(list(source._values.keys()) == ['A_gen'])
+
+        a = pylcaio.LCAIO(verbose=False)
+        a.extract_background(temporary + 'test_lazy.mat')
+        a.extract_foreground(temporary + 'test_lazy.mat')
+        b = pylcaio.LCAIO(verbose=False)
+        b.extract_background(self.matdict)
+        b.extract_foreground(self.matdict)
+        np.testing.assert_allclose(a.A.values, b.A.values)
+
+    def test_decode_labels(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        sio.savemat(temporary + 'test_labels.mat', self.matdict)
+        loaded = sio.loadmat(temporary + 'test_labels.mat')
+        for key in ['PRO_f', 'PRO_gen', 'STR', 'IMP', 'PRO_header']:
+            mined = pylcaio.mine_nested_array(loaded[key].copy())
+            decoded = pylcaio.decode_labels(loaded[key])
+            assert(mined.shape == decoded.shape)
+            assert((mined == decoded).all())
+
+        # mixed numeric kinds in a column, not coerced to float
+        mixed = np.empty((2, 1), dtype=object)
+        mixed[0, 0] = np.array([[7]], dtype=np.uint8)
+        mixed[1, 0] = np.array([[2.5]])
+        decoded = pylcaio.decode_labels(mixed)
+        self.assertEqual(decoded.tolist(),
+                         pylcaio.mine_nested_array(mixed.copy()).tolist())
+        assert(isinstance(decoded[0, 0], np.integer))
+
+        typed = pylcaio.decode_labels(loaded['PRO_gen'], typed=True)
+        assert(str(typed[0].dtype) == 'category')
+        assert(typed[1].dtype == np.int64)
+        assert(typed[1].tolist() == [1, 2, 3, 4])
+
+    @unittest.skipIf(pylcaio.h5py is None, "h5py not installed")
+    def test_hdf5_matfile(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+        filename = temporary + 'test_v73.mat'
+        write_hdf5_matfile(filename, self.matdict)
+
+        source = pylcaio.MatFile(filename)
+        assert(source.hdf5)
+        np.testing.assert_allclose(source['A_bf'].toarray(),
+                                   self.matdict['A_bf'].toarray())
+        assert(source['PRO_f'][0, 0][0] == 's+orm')
+
+        a = pylcaio.LCAIO(verbose=False)
+        a.extract_background(filename)
+        a.extract_foreground(filename)
+        b = pylcaio.LCAIO(verbose=False)
+        b.extract_background(self.matdict)
+        b.extract_foreground(self.matdict)
+        np.testing.assert_allclose(a.A.values, b.A.values)
+        assert(list(a.PRO.index) == list(b.PRO.index))
+
+        # empty label cells, as common in ecoinvent exports
+        table = np.array([['abc', ''], ['de', 'x']], dtype=object)
+        write_hdf5_matfile(filename, {'labels': table})
+        sio.savemat(temporary + 'test_v5.mat', {'labels': table})
+        v73 = pylcaio.MatFile(filename)['labels']
+        v5 = sio.loadmat(temporary + 'test_v5.mat')['labels']
+        self.assertEqual(v73[0, 1].shape, v5[0, 1].shape)
+        self.assertEqual(pylcaio.decode_labels(v73).tolist(),
+                         [['abc', 0], ['de', 'x']])
+        self.assertEqual(pylcaio.decode_labels(v73).tolist(),
+                         pylcaio.decode_labels(v5).tolist())
+        typed = pylcaio.decode_labels(v73, typed=True)
+        self.assertEqual(typed[1].tolist(), [0, 'x'])
+
+    def test_save_and_load(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        for sparse, path in ((False, 'test_saved'), (True, 'test_saved.zip')):
+            a = pylcaio.LCAIO([0,1], verbose=False, sparse=sparse)
+            mrio = pymrio.load_test()
+            mrio.calc_all()
+            a.extract_background(self.matdict)
+            a.extract_foreground(self.matdict)
+            a.extract_io_background_from_pymrio(mrio)
+            a.io_categories['material']=['mining', 'food']
+            a.hyb = pd.DataFrame([(('Batt Packing', 10002),
+                                   ('reg2', 'transport'), 0.1)],
+                                 columns=['process_index', 'io_index',
+                                          'price_per_fu'])
+            a.hybridize_all(doublecounted_categories=('material',))
+            a.save(temporary + path)
+
+            b = pylcaio.LCAIO.load(temporary + path, verbose=False)
+            assert(b.sparse == sparse)
+            assert(b.io_categories == a.io_categories)
+            for name in a._LABEL_TABLES + ('hyb',):
+                pdt.assert_frame_equal(getattr(a, name), getattr(b, name))
+            for name in a._BLOCKS:
+                assert(getattr(a, name).index.equals(getattr(b, name).index))
+                assert(getattr(a, name).columns.equals(
+                                                getattr(b, name).columns))
+                np.testing.assert_allclose(
+                        pylcaio.to_csc(getattr(a, name)).toarray(),
+                        pylcaio.to_csc(getattr(b, name)).toarray())
+            np.testing.assert_allclose(
+                    pylcaio.to_csc(a.calc_lifecycle('impacts')).toarray(),
+                    pylcaio.to_csc(b.calc_lifecycle('impacts')).toarray())
+
+    def test_shared_background(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        a.io_categories['material']=['mining', 'food']
+        a.save_shared_background(temporary + 'test_shared')
+
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        b.extract_foreground(self.matdict)
+        b.attach_shared_background(temporary + 'test_shared')
+        # memory-mapped read-only
+        assert(not b.A_io.matrix.data.flags.writeable)
+        assert(b.A_ff.matrix.data.flags.writeable)
+
+        for i in (a, b):
+            i.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                    0.1, doublecounted_categories=('material',))
+        np.testing.assert_allclose(a.A.toarray(), b.A.toarray())
+        np.testing.assert_allclose(
+                pylcaio.to_csc(a.calc_lifecycle('impacts')).toarray(),
+                pylcaio.to_csc(b.calc_lifecycle('impacts')).toarray())
+
+        with self.assertRaises(ValueError):
+            pylcaio.LCAIO([0,1], verbose=False).attach_shared_background(
+                    temporary + 'test_shared')
+
+    def test_to_matfile_whole_system(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+
+        for sparse in (False, True):
+            a = pylcaio.LCAIO([0,1], verbose=False, sparse=sparse)
+            mrio = pymrio.load_test()
+            mrio.calc_all()
+            a.extract_background(self.matdict)
+            a.extract_foreground(self.matdict)
+            a.extract_io_background_from_pymrio(mrio)
+            a.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+            a.to_matfile(temporary + 'test_system.mat', do_compression=True)
+            whole = sio.loadmat(temporary + 'test_system.mat')
+
+            np.testing.assert_allclose(whole['A_gen'].toarray(),
+                                       pylcaio.to_csc(a.A).toarray())
+            np.testing.assert_allclose(whole['F_gen'].toarray(),
+                                       pylcaio.to_csc(a.F).toarray())
+            np.testing.assert_allclose(
+                    whole['C'].toarray(),
+                    np.nan_to_num(pylcaio.to_csc(a.C_all).toarray()))
+            assert(whole['PRO_gen'].shape == a.PRO.shape)
+
+    def test_read_characterisation_cached(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+        filename = temporary + 'test_char.xlsx'
+        cache_dir = temporary + 'test_char_cache'
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        with open(filename, 'wb') as f:
+            f.write(b'stand-in for spreadsheet content')
+
+        sheets = {'Q_a': pd.DataFrame([['', '', 's1', 's2'],
+                                       ['GWP', 'kg', 1.0, 2.0],
+                                       ['ODP', 'kg', 0.0, 3.0]]),
+                  'Q_b': pd.DataFrame([['', '', 's3'],
+                                       ['GWP', 'kg', 5.0]])}
+        param = {'Q_a': (['impact', 'unit'], ['stressor'], None, None),
+                 'Q_b': (['impact', 'unit'], ['stressor'], None, None)}
+        calls = []
+
+        def read_excel(io, sheet_name, **kwds):
+            calls.append(sheet_name)
+            return {i: sheets[i].copy() for i in sheet_name}
+
+        original = pd.read_excel
+        try:
+            pd.read_excel = read_excel
+            C = pylcaio.read_characterisation(filename, param)
+            assert(calls == [['Q_a', 'Q_b']])  # all sheets in one pass
+            assert(C.shape == (3, 3))
+            assert(np.nansum(C.values.astype(float)) == 11.0)
+
+            for i in range(2):
+                cached = pylcaio.read_characterisation(filename, param,
+                                                       cache_dir)
+                pdt.assert_frame_equal(C, cached)
+            assert(len(calls) == 2)  # 2nd call skipped spreadsheet
+            assert(len(os.listdir(cache_dir)) == 1)
+
+            # changed parameters, new cache entry
+            param['Q_b'] = (['impact', 'unit'], ['stressor'], [1], None)
+            pylcaio.read_characterisation(filename, param, cache_dir)
+            assert(len(calls) == 3)
+            assert(len(os.listdir(cache_dir)) == 2)
+        finally:
+            pd.read_excel = original
+
+    def test_run_scenarios(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True, solver='block')
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        A_io_f = a.A_io_f.toarray()
+
+        scenarios = [{'name': 'reference'},
+                     {'name': 'hybrid',
+                      'hybridize': [{'process_index': ('Batt Packing', 10002),
+                                     'io_index': ('reg2', 'transport'),
+                                     'price': 0.1,
+                                     'doublecounted_intrasector': 0.5}]},
+                     {'demand': {('back01', 1): 2.0}}]
+
+        serial = a.run_scenarios(scenarios, max_workers=1)
+        parallel = a.run_scenarios(scenarios, max_workers=2)
+        pdt.assert_frame_equal(serial, parallel)
+        assert(list(serial.columns) == ['scenario', 'label', 'demand',
+                                        'value'])
+        assert(set(serial.scenario) == {'reference', 'hybrid', 2})
+
+        # base object untouched, background factorizations kept
+        np.testing.assert_allclose(a.A_io_f.toarray(), A_io_f)
+        assert('lu_bb' in a._cache)
+
+        # nothing handed back that stems from a scenario's changes
+        c = pylcaio.LCAIO([0,1], verbose=False, sparse=True, instrument=True,
+                          solver_options={'incremental': True})
+        c.extract_background(self.matdict)
+        c.extract_foreground(self.matdict)
+        c.extract_io_background_from_pymrio(self.mrio)
+        stages = len(c.metrics)
+        c.run_scenarios(scenarios[1:2], max_workers=1)
+        assert('lu_base' not in c._cache)
+        self.assertEqual(len(c.metrics), stages)
+
+        # same as calculating each scenario on its own
+        b = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        mrio = pymrio.load_test()
+        mrio.calc_all()
+        b.extract_background(self.matdict)
+        b.extract_foreground(self.matdict)
+        b.extract_io_background_from_pymrio(mrio)
+        b.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                            0.1, doublecounted_intrasector=0.5)
+        hybrid = serial[serial.scenario == 'hybrid']
+        np.testing.assert_allclose(hybrid.value.values,
+                                   b.calc_lifecycle('impacts').values[:, 0])
+        demand = serial[serial.scenario == 2]
+        np.testing.assert_allclose(
+                demand.value.values,
+                b.calc_lifecycle_batch([{('back01', 1): 2.0}]).values[:, 0])
+
+    def test_monte_carlo(self):
+
+        a = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        a.C_io = pylcaio.SparseFrame(np.ones((1, len(a.STR_io))),
+                                     [('GWP_io', 2)], a.STR_io.index)
+        a.IMP_io = pd.DataFrame([['GWP_io', 2, 'kg']],
+                                index=a.C_io.index, columns=a.IMP.columns)
+        a.hyb = pd.DataFrame([(('Batt Packing', 10002),
+                               ('reg2', 'transport'), 0.1)],
+                             columns=['process_index', 'io_index',
+                                      'price_per_fu'])
+        a.hybridize_all()
+        deterministic = a.calc_lifecycle('impacts').values[:, 0]
+
+        mc = pylcaio.MonteCarlo(a)
+        mc.add_uncertainty('A_ff', ('Batt Packing', 10002), ('s+orm', 10005),
+                           'lognormal', sigma=0.1)
+        mc.add_uncertainty('A_bf', ('back02', 2), ('s+orm', 10005),
+                           'uniform', low=0.5, high=1.5)
+        mc.add_uncertainty('F_f', ('stress01', 1614), ('s+orm', 10005),
+                           'triangular', low=0.2, high=0.5)
+        mc.add_price_uncertainty(('Batt Packing', 10002), 'normal', sd=0.01)
+        with self.assertRaises(ValueError):
+            mc.add_uncertainty('A_bb', ('back02', 2), ('back01', 1),
+                               'normal', sd=0.1)
+        with self.assertRaises(ValueError):
+            mc.add_uncertainty('A_ff', ('Batt Packing', 10002),
+                               ('s+orm', 10005), 'normal')
+
+        # batch of samples gives same results as solving each perturbed system
+        rng = np.random.default_rng(42)
+        samples = mc.sample(3, rng)
+        results = mc.calculate(samples)
+        A = a.A.toarray()
+        F = a.F.toarray()
+        C = np.nan_to_num(a.C_all.toarray())
+        y = a.y.values[:, 0]
+        for s in range(3):
+            A_s, F_s = A.copy(), F.copy()
+            rows, cols, delta = samples['A']
+            A_s[rows, cols] += delta[:, s]
+            rows, cols, delta = samples['F']
+            F_s[rows, cols] += delta[:, s]
+            x = np.linalg.solve(np.eye(len(A)) - A_s, y)
+            np.testing.assert_allclose(results[:, s], C.dot(F_s.dot(x)))
+
+        # same through low-rank updates, as for large foregrounds
+        large = pylcaio.MonteCarlo(a)
+        large.entries = list(mc.entries)
+        large.prices = list(mc.prices)
+        large.add_uncertainty('A_ff', ('s+orm', 10005), ('s+orm', 10005),
+                              'normal', sd=0.05)
+        samples = large.sample(5, rng)
+        dense = large.calculate(samples)
+        large._DENSE_FOREGROUND = 0
+        np.testing.assert_allclose(large.calculate(samples), dense)
+        np.testing.assert_allclose(large.calculate(samples), dense)  # cached
+
+        # statistics, reproducible, also in parallel
+        summary = mc.run(200, batch_size=64, seed=1)
+        assert(list(summary.columns) == ['mean', 'std', 'min', 'max',
+                                         'p2.5', 'p50', 'p97.5'])
+        pdt.assert_frame_equal(summary, mc.run(200, batch_size=64, seed=1))
+        assert(np.all(summary['min'] <= summary['p50']))
+        assert(np.all(summary['p50'] <= summary['max']))
+        parallel = mc.run(200, batch_size=64, seed=1, max_workers=2)
+        np.testing.assert_allclose(parallel['mean'], summary['mean'],
+                                   rtol=0.1)
+
+        # price of a process hybridized on its own
+        c = pylcaio.LCAIO([0,1], verbose=False, sparse=True)
+        c.extract_background(self.matdict)
+        c.extract_foreground(self.matdict)
+        c.extract_io_background_from_pymrio(self.mrio)
+        c.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                            0.2)
+        c.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                            0.3, overwrite=True)
+        c.hyb = pd.concat([c.hyb, a.hyb], ignore_index=True)
+        priced = pylcaio.MonteCarlo(c)
+        priced.add_price_uncertainty(('Batt Packing', 10002), 'uniform',
+                                     low=0.25, high=0.35)
+        self.assertEqual(priced.prices[0]['value'], 0.3)
+
+        # no uncertainty, no variation
+        certain = pylcaio.MonteCarlo(a).run(10)
+        np.testing.assert_allclose(certain['mean'], deterministic)
+        np.testing.assert_allclose(certain['std'], 0, atol=1e-12)
+
+    def test_streaming_statistics(self):
+
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(3, 1000))
+        whole = pylcaio.StreamingStatistics(3, reservoir_size=1000)
+        part = pylcaio.StreamingStatistics(3, reservoir_size=1000)
+        other = pylcaio.StreamingStatistics(3, reservoir_size=1000)
+        for i in range(0, 1000, 300):
+            whole.update(data[:, i:i + 300])
+        part.update(data[:, :400])
+        other.update(data[:, 400:])
+        part.merge(other)
+        for stats in (whole, part):
+            assert(stats.n == 1000)
+            np.testing.assert_allclose(stats.mean, data.mean(axis=1))
+            np.testing.assert_allclose(stats.std, data.std(axis=1, ddof=1))
+            np.testing.assert_allclose(stats.min, data.min(axis=1))
+        np.testing.assert_allclose(whole.summary()['p50'],
+                                   np.median(data, axis=1))
+
+        # bounded memory, roughly right percentiles
+        small = pylcaio.StreamingStatistics(3, reservoir_size=200, rng=1)
+        for i in range(0, 1000, 100):
+            small.update(data[:, i:i + 100])
+        assert(small.reservoir.shape == (3, 200))
+        np.testing.assert_allclose(small.summary()['p50'], 0, atol=0.3)
+
+    def test_contribution_analysis(self):
+
+        results = {}
+        for sparse in (True, False):
+            a = pylcaio.LCAIO([0,1], verbose=False, sparse=sparse)
+            mrio = pymrio.load_test()
+            mrio.calc_all()
+            a.extract_background(self.matdict)
+            a.extract_foreground(self.matdict)
+            a.extract_io_background_from_pymrio(mrio)
+            a.hybridize_process(('Batt Packing', 10002), ('reg2', 'transport'),
+                                0.1)
+            results[sparse] = {by: a.contribution_analysis(by) for by in
+                               ('process', 'stressor', 'block', 'sector')}
+            if sparse:
+                d = a.calc_lifecycle().values
+
+            assert(list(results[sparse]['block'].index) ==
+                   ['foreground', 'background', 'io'])
+            relative = a.contribution_analysis('process', relative=True)
+            np.testing.assert_allclose(relative.sum(axis=0).iloc[0], 1.0)
+            with self.assertRaises(ValueError):
+                a.contribution_analysis('region')
+
+            # any level of the IO index, as in hybridization methods
+            regions = a.contribution_analysis('sector',
+                                              sector_level_name='region')
+            assert(list(regions.index) == sorted(set(
+                    a.PRO_io.index.get_level_values('region'))))
+            self.assertEqual(regions.index.name, 'region')
+            np.testing.assert_allclose(regions.sum(axis=0).values,
+                                       results[sparse]['sector'].sum(axis=0))
+
+        # contributions add up to lifecycle impacts (IO sectors only to part
+        # of them), and do not depend on mode
+        for by, contributions in results[True].items():
+            if by != 'sector':
+                np.testing.assert_allclose(contributions.sum(axis=0).values,
+                                           d[:, 0])
+            np.testing.assert_allclose(contributions.values,
+                                       results[False][by].values)
+
+    def test_structural_path_analysis(self):
+
+        matdict = self.matdict.copy()
+        matdict['A_ff'] = scipy.sparse.csc_matrix([[0.0, 0.1], [0.2, 0.1]])
+        matdict['A_gen'] = self.matdict['A_gen'] * 0.1
+        matdict['A_bf'] = self.matdict['A_bf'] * 0.5
+        matdict['F_gen'] = scipy.sparse.csc_matrix(np.ones((3, 4)))
+
+        for solver in ('lu', 'block'):
+            a = pylcaio.LCAIO([0,1], verbose=False, solver=solver)
+            a.extract_background(matdict)
+            a.extract_foreground(matdict)
+            impact = a.C_all.index[0]
+            total = a.calc_lifecycle().values[0, 0]
+
+            paths = a.structural_path_analysis(impact, cutoff=1e-4,
+                                               max_depth=20, max_paths=10000)
+            assert(paths['path'][0] == (('s+orm', 10005),))
+            self.assertAlmostEqual(paths['total'][0], total)
+            assert(np.all(paths['depth'] <= 20))
+            assert(0.99 * total < paths['direct'].sum() <= total + 1e-12)
+
+            # bounded enumeration
+            few = a.structural_path_analysis(impact, max_paths=5)
+            assert(len(few) == 5)
+            shallow = a.structural_path_analysis(impact, cutoff=0,
+                                                 max_depth=1)
+            assert(shallow['depth'].max() == 1)
+
+    def test_instrumentation(self):
+
+        if os.name == 'nt':
+            temporary = '/temp/'
+        else:
+            temporary = '/tmp/'
+        logfile = temporary + 'test_instrumentation.log'
+        root_handlers = list(logging.getLogger().handlers)
+
+        a = pylcaio.LCAIO([0,1], verbose=False, logfile=logfile,
+                          sparse=True, instrument='memory')
+        a.extract_background(self.matdict)
+        a.extract_foreground(self.matdict)
+        a.extract_io_background_from_pymrio(self.mrio)
+        a.calc_lifecycle('impacts')
+
+        # root logger untouched, messages in logfile
+        self.assertEqual(logging.getLogger().handlers, root_handlers)
+        for handler in a.log.logger.handlers:
+            handler.flush()
+        with open(logfile) as f:
+            assert('final demand from IO' in f.read())
+
+        metrics = a.get_metrics()
+        stages = [i['stage'] for i in metrics['stages']]
+        self.assertEqual(stages[:3], ['extract_background',
+                                      'extract_foreground',
+                                      'extract_io_background_from_pymrio'])
+        background = metrics['stages'][0]
+        self.assertEqual(background['sizes']['A_bb'],
+                         {'shape': [4, 4], 'nnz': 5, 'density': 5 / 16})
+        assert(background['time'] >= 0 and background['peak_memory'] > 0)
+
+        # factorization nested in calc_lifecycle, with fill-in
+        calc = stages.index('calc_lifecycle')
+        lu = metrics['stages'][stages.index('factorization')]
+        assert(lu['depth'] > metrics['stages'][calc]['depth'])
+        assert(lu['sizes']['lu']['fill_in'] >= 1.0)
+        self.assertEqual(metrics['totals']['calc_lifecycle']['calls'], 1)
+        self.assertEqual(json.loads(a.get_metrics(as_json=True)),
+                         json.loads(json.dumps(metrics)))
+
+        a.reset_metrics()
+        self.assertEqual(a.get_metrics()['stages'], [])
+
+        # no instrumentation by default
+        b = pylcaio.LCAIO([0,1], verbose=False)
+        b.extract_background(self.matdict)
+        self.assertEqual(b.get_metrics()['stages'], [])
+
+        # peak memory without tracemalloc.reset_peak(), as before Python 3.9
+        original = pylcaio._RESET_PEAK
+        try:
+            pylcaio._RESET_PEAK = False
+            c = pylcaio.LCAIO([0,1], verbose=False, instrument='memory')
+            c.extract_background(self.matdict)
+            c.calc_lifecycle('impacts')
+            assert(all(i['peak_memory'] >= 0 for i in c.metrics))
+        finally:
+            pylcaio._RESET_PEAK = original
+
+        # module logger left to the application, verbose per object
+        logger = logging.getLogger('pylcaio')
+        self.assertEqual(logger.level, logging.NOTSET)
+        self.assertEqual(logger.handlers, [])
+        verbose = pylcaio.LCAIO([0,1], verbose=True)
+        self.assertEqual(verbose.log.logger.name, 'pylcaio.verbose')
+        assert(verbose.log.isEnabledFor(logging.INFO))
+        assert(b.log.logger is logger)
+        self.assertEqual(logger.handlers, [])
+        assert(pickle.loads(pickle.dumps(verbose.log)).verbose)
+
+        # log file shared by objects, closed with the last one
+        other = pylcaio.LCAIO([0,1], verbose=False, logfile=logfile)
+        handler = a.log.logger.handlers[0]
+        a.log.close()
+        assert(handler.stream is not None)
+        other.log.close()
+        assert(handler.stream is None)
+        self.assertEqual(a.log.logger.handlers, [])
+        os.remove(logfile)
+
+    def test_benchmark_synthetic_system(self):
+
+        size = {'n_background': 50, 'n_stressors': 10, 'n_impacts': 2,
+                'n_foreground': 5, 'n_regions': 2, 'n_sectors': 3,
+                'n_hybridized': 2}
+        matdict = benchmark_pylcaio.generate_matdict(50, 10, 2, 5)
+        assert(isinstance(matdict['PRO_gen'][0, 0], np.ndarray))  # as loadmat
+        results = benchmark_pylcaio.run_benchmarks(size, sparse=True,
+                                                   verbose=False)
+        self.assertEqual(list(results), list(benchmark_pylcaio.STEPS))
+        for result in results.values():
+            assert('error' not in result)
+            assert(result['time'] >= 0 and result['peak_memory'] >= 0)
+
+        self.assertEqual(benchmark_pylcaio.compare(results, results), [])
+        slower = {step: dict(result, time=2 * result['time'] + 1.0)
+                  for step, result in results.items()}
+        self.assertEqual(len(benchmark_pylcaio.compare(slower, results)),
+                         len(results))
+
 #=========================================================
+def write_hdf5_matfile(filename, matdict):
+    """ Write dictionary the way Matlab would in a v7.3 file """
+    import h5py
+
+    with h5py.File(filename, 'w', userblock_size=512) as f:
+        refs = f.create_group('#refs#')
+
+        def write(group, name, value):
+            if scipy.sparse.issparse(value):
+                value = scipy.sparse.csc_matrix(value, dtype=float)
+                node = group.create_group(name)
+                node.attrs['MATLAB_class'] = np.bytes_('double')
+                node.attrs['MATLAB_sparse'] = np.uint64(value.shape[0])
+                node['data'] = value.data
+                node['ir'] = value.indices.astype(np.uint64)
+                node['jc'] = value.indptr.astype(np.uint64)
+            elif isinstance(value, str) and not value:
+                # Matlab stores the dimensions of empty arrays as data
+                node = group.create_dataset(
+                        name, data=np.zeros(2, dtype=np.uint64))
+                node.attrs['MATLAB_class'] = np.bytes_('char')
+                node.attrs['MATLAB_empty'] = np.uint8(1)
+            elif isinstance(value, str):
+                node = group.create_dataset(
+                        name, data=np.array([[ord(c)] for c in value],
+                                            dtype=np.uint16))
+                node.attrs['MATLAB_class'] = np.bytes_('char')
+            elif np.asarray(value).dtype.kind in 'OU':
+                value = np.asarray(value, dtype=object)
+                cells = np.empty(value.T.shape, dtype=h5py.ref_dtype)
+                for index, cell in np.ndenumerate(value.T):
+                    key = str(len(refs))
+                    cells[index] = write(refs, key, cell).ref
+                node = group.create_dataset(name, data=cells)
+                node.attrs['MATLAB_class'] = np.bytes_('cell')
+            else:
+                node = group.create_dataset(
+                        name, data=np.atleast_2d(np.asarray(value,
+                                                            dtype=float)).T)
+                node.attrs['MATLAB_class'] = np.bytes_('double')
+            return node
+
+        for key, value in matdict.items():
+            write(f, key, value)
+
+    with open(filename, 'r+b') as f:
+        f.write(b'MATLAB 7.3 MAT-file'.ljust(128))
+
+
 def assert_frames_equivalent(df1, df2, **kwds):
     pdt.assert_frame_equal(df1.sort_index().sort(axis=1),
                            df2.sort_index().sort(axis=1),